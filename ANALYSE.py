@@ -3,37 +3,40 @@ import pandas as pd
 import plotly.graph_objects as go
 import os
 
+from heart_rate import (
+    EPISODE_MIN_PROMINENCE, HR_PLOT_MAX_POINTS, RECOVERY_CURVE_MINUTES, detect_episodes, format_load_stats, format_offset,
+    load_heart_rate_file, parse_offsets, recovery, recovery_curve_offsets, split_windows
+)
+
 
 # Chargement du fichier CSV
 uploaded_file = st.file_uploader("Choisissez un fichier CSV", type=["csv"])
 
 if uploaded_file is not None:
     try:
-        # Lecture du CSV en utilisant la 3ème ligne comme en-tête
-        df = pd.read_csv(uploaded_file, skiprows=2, header=0, encoding="utf-8", low_memory=False)
+        # Lecture du CSV (3ème ligne comme en-tête) : colonnes Time et HR (bpm) seulement,
+        # format de l'heure détecté une fois, résultat en cache par contenu du fichier
+        recording = load_heart_rate_file(uploaded_file.getvalue())
+        df = recording.data
         
         # Vérification de la présence des colonnes nécessaires
         if "Time" in df.columns and "HR (bpm)" in df.columns:
-            # Conversion de la colonne Time en datetime et calcul du temps écoulé en minutes
-            df["Time"] = pd.to_datetime(df["Time"], errors="coerce")
-            df["Elapsed Minutes"] = (df["Time"] - df["Time"].min()).dt.total_seconds() / 60
+            st.caption(format_load_stats(recording))
+            # Temps écoulé en minutes et index temporel trié, calculés au chargement
+            series = recording.series
             
-            # Création du graphique complet
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=df["Elapsed Minutes"],
-                y=df["HR (bpm)"],
-                mode="lines",
-                name="HR (bpm)"
-            ))
-            # Ici, on définit le hovermode à "x unified" pour conserver l'étiquette unifiée
-            fig.update_layout(
-                title="Fréquence cardiaque en fonction du temps",
-                xaxis_title="Temps (minutes)",
-                yaxis_title="HR (bpm)",
-                hovermode="x unified"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            # Tracé allégé : la plage choisie ci-dessous est ré-échantillonnée (min/max par paquet)
+            # à un nombre borné de points ; les statistiques utilisent toujours tous les échantillons
+            downsample = st.toggle("Tracé allégé (sous-échantillonné)", value=True)
+            # Détection automatique des efforts sur toute la séance (pics de FC et récupération)
+            detect = st.toggle("Détection automatique des épisodes")
+            episodes = None
+            if detect:
+                min_prominence = st.number_input("Hauteur minimale d'un pic au-dessus des creux voisins (bpm)",
+                                                 min_value=1.0, value=float(EPISODE_MIN_PROMINENCE), step=1.0)
+                episodes = detect_episodes(recording.stats, min_prominence=min_prominence)
+            # Le graphique est tracé après la saisie de la plage, à cet emplacement
+            chart_area = st.container()
             
             st.write("Sélectionnez manuellement la plage de l'axe X en indiquant le début et la fin (en minutes) :")
             
@@ -58,30 +61,80 @@ if uploaded_file is not None:
                     format="%.2f"
                 )
             
+            # Création du graphique (plage choisie en mode allégé, fichier complet sinon)
+            if downsample:
+                plot_start, plot_end = (x_min_manual, x_max_manual) if x_min_manual <= x_max_manual else (None, None)
+                plot_x, plot_y = series.plot_points(plot_start, plot_end, HR_PLOT_MAX_POINTS)
+            else:
+                plot_x, plot_y = df["Elapsed Minutes"], df["HR (bpm)"]
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(
+                x=plot_x,
+                y=plot_y,
+                mode="lines",
+                name="HR (bpm)"
+            ))
+            # Ici, on définit le hovermode à "x unified" pour conserver l'étiquette unifiée
+            fig.update_layout(
+                title="Fréquence cardiaque en fonction du temps",
+                xaxis_title="Temps (minutes)",
+                yaxis_title="HR (bpm)",
+                hovermode="x unified"
+            )
+            if episodes is not None and not episodes.empty:
+                # Marqueurs des épisodes visibles sur le graphique (plage tracée en mode allégé)
+                shown = episodes
+                if downsample and plot_start is not None:
+                    shown = episodes[episodes["Temps HR max"].between(plot_start, plot_end)]
+                fig.add_trace(go.Scatter(
+                    x=shown["Temps HR max"],
+                    y=shown["HR max"],
+                    mode="markers+text",
+                    marker=dict(color="red", size=9, symbol="triangle-down"),
+                    text=shown["Épisode"].astype(str),
+                    textposition="top center",
+                    name="HR max (épisode)"
+                ))
+                fig.add_trace(go.Scatter(
+                    x=shown["Début"],
+                    y=shown["FC début"],
+                    mode="markers",
+                    marker=dict(color="green", size=7),
+                    name="Début d'effort"
+                ))
+            with chart_area:
+                st.plotly_chart(fig, use_container_width=True)
+                st.caption(f"{len(plot_x)} points tracés sur {len(series)} échantillons")
+                if episodes is not None:
+                    if episodes.empty:
+                        st.write("Aucun épisode détecté avec ce seuil.")
+                    else:
+                        st.write(f"**{len(episodes)} épisodes détectés** (différences avec HR max de l'épisode, "
+                                 "vides si l'effort suivant a commencé)")
+                        st.dataframe(episodes.round(2), hide_index=True)
+            
             if x_max_manual < x_min_manual:
                 st.error("La valeur de fin doit être supérieure à la valeur de début.")
             else:
-                # Filtrage des données en fonction de la plage saisie
-                df_selected = df[(df["Elapsed Minutes"] >= x_min_manual) & (df["Elapsed Minutes"] <= x_max_manual)]
+                # Statistiques de la plage saisie en temps constant (tables précalculées au chargement)
+                summary = recording.stats.window(x_min_manual, x_max_manual)
                 
                 st.write(f"**Plage sélectionnée :** {x_min_manual:.2f} - {x_max_manual:.2f} minutes")
                 
-                if not df_selected.empty:
-                    hr_max = df_selected["HR (bpm)"].max()
-                    hr_mean = df_selected["HR (bpm)"].mean()
-                    hr_min = df_selected["HR (bpm)"].min()
-                    hr_max_time = df_selected[df_selected["HR (bpm)"] == hr_max]["Elapsed Minutes"].values[0]
+                if summary is not None:
+                    hr_max = summary["HR max"]
+                    hr_mean = summary["HR moyenne"]
+                    hr_min = summary["HR min"]
+                    hr_max_time = summary["Temps HR max"]
                     
-                    # Récupération des HR à 1, 2, 3 et 5 minutes après HR max
-                    time_offsets = [1, 2, 3, 5]
-                    hr_differences = {}
-                    hr_values = []
-                    
-                    for offset in time_offsets:
-                        hr_time = hr_max_time + offset
-                        nearest_hr = df.iloc[(df["Elapsed Minutes"] - hr_time).abs().argsort()[:1]]["HR (bpm)"].values[0]
-                        hr_differences[offset] = hr_max - nearest_hr
-                        
+                    # Récupération aux décalages choisis après HR max : FC interpolée entre deux échantillons
+                    offsets_text = st.text_input("Décalages de récupération (minutes, séparés par des virgules)", value="1, 2, 3, 5")
+                    try:
+                        time_offsets = parse_offsets(offsets_text)
+                    except ValueError as e:
+                        st.error(str(e))
+                        time_offsets = []
+                    hr_values, hr_differences = recovery(series, hr_max_time, hr_max, time_offsets)
                     
                     col1, col2 = st.columns(2)
                     with col1:
@@ -91,12 +144,38 @@ if uploaded_file is not None:
                     
                     with col2:
                         recovery_data = pd.DataFrame({
-                            "Δ Récupération": ["1 min", "2 min", "3 min", "5 min"],
-                            "Différence avec HR max": list(hr_differences.values())
+                            "Δ Récupération": [format_offset(offset) for offset in time_offsets],
+                            "Différence avec HR max": hr_differences
                         })
                         recovery_data = recovery_data.dropna(axis=1, how='all')  # Suppression des colonnes vides
                         recovery_data = recovery_data.iloc[:, :2]  # Forcer le tableau à n'avoir que deux colonnes
                         st.dataframe(recovery_data.set_index("Δ Récupération"))
+                    
+                    # Courbe de récupération seconde par seconde après HR max
+                    if st.checkbox("Afficher la courbe de récupération seconde par seconde"):
+                        horizon = st.number_input("Durée de la courbe (minutes)", min_value=0.5,
+                                                  value=float(RECOVERY_CURVE_MINUTES), step=0.5)
+                        curve_offsets = recovery_curve_offsets(horizon)
+                        _, curve_differences = recovery(series, hr_max_time, hr_max, curve_offsets)
+                        fig_recovery = go.Figure(go.Scatter(x=curve_offsets, y=curve_differences, mode="lines",
+                                                            name="Différence avec HR max"))
+                        fig_recovery.update_layout(
+                            title="Courbe de récupération après HR max",
+                            xaxis_title="Temps après HR max (minutes)",
+                            yaxis_title="Différence avec HR max (bpm)"
+                        )
+                        st.plotly_chart(fig_recovery, use_container_width=True)
+                    
+                    # Comparaison de fenêtres de la plage sélectionnée (mi-temps, blocs de N minutes)
+                    comparison = st.selectbox("Comparer des fenêtres",
+                                              ["Aucune", "Mi-temps (2 blocs)", "Blocs de N minutes"])
+                    if comparison != "Aucune":
+                        if comparison == "Mi-temps (2 blocs)":
+                            starts, ends = split_windows(x_min_manual, x_max_manual, parts=2)
+                        else:
+                            block_minutes = st.number_input("Durée des blocs (minutes)", min_value=0.5, value=5.0, step=0.5)
+                            starts, ends = split_windows(x_min_manual, x_max_manual, block_minutes=block_minutes)
+                        st.dataframe(recording.stats.windows(starts, ends).round(2), hide_index=True)
                 else:
                     st.write("Aucune donnée dans la plage sélectionnée.")
         else:
@@ -2,6 +2,7 @@ import streamlit as st
 import os
 import base64
 import time
+from pdf_render import start_renderer_pool
 
 # Configuration de la page : mode wide (large)
 st.set_page_config(page_title="Pôle Liévin", page_icon="⚽", layout="wide")
@@ -97,6 +98,9 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# Démarrage en arrière-plan des processus de rendu des graphiques PDF (Kaleido)
+start_renderer_pool()
+
 # Initialisation de la navigation multi-pages
 if "page" not in st.session_state:
     st.session_state.page = "home"
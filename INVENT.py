@@ -3,13 +3,12 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import os
 from fpdf import FPDF
-import tempfile
 from PIL import Image, ImageFile
 import base64
 import io
-import zipfile
+import os
+import time
 
 # Permettre à PIL de charger des images tronquées
 ImageFile.LOAD_TRUNCATED_IMAGES = True
@@ -37,43 +36,32 @@ def load_folder():
     Charge un dossier compressé (ZIP) contenant :
       - Un fichier Excel (avec les feuilles 'CSV', 'Vidéo', 'Poste', 'Constante')
       - Un dossier "Trombi" avec les images des joueurs.
-    Le dossier est extrait dans un répertoire temporaire persistant et le chemin
-    de ce répertoire (base_folder) est renvoyé.
+    L'archive n'est pas extraite : elle est renvoyée sous forme de ZipDataset (dataset),
+    qui lit l'Excel directement en mémoire et ouvre les photos du Trombi à la demande.
+    La lecture des feuilles est mise en cache selon le contenu du ZIP
+    (voir ingestion.load_archive) : les reruns et les autres sessions ne relisent pas l'Excel.
     """
+    from ingestion import load_archive, format_load_timings
+
     uploaded_zip = st.file_uploader("Charger un dossier compressé (ZIP) contenant l'Excel et le dossier Trombi", type=["zip"])
     if uploaded_zip is not None:
         try:
-            base_folder = tempfile.mkdtemp()
-            zip_path = os.path.join(base_folder, "uploaded.zip")
-            with open(zip_path, "wb") as f:
-                f.write(uploaded_zip.getvalue())
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(base_folder)
-            excel_file_path = None
-            for root, dirs, files in os.walk(base_folder):
-                for file in files:
-                    if file.lower().endswith((".xls", ".xlsx", ".xlsm")):
-                        excel_file_path = os.path.join(root, file)
-                        break
-                if excel_file_path:
-                    break
-            if excel_file_path is None:
+            dataset = load_archive(uploaded_zip.getvalue())
+            # Vignettes du Trombi générées en arrière-plan, sans retarder l'affichage
+            dataset.warm_portraits()
+            if dataset.excel_member is None:
                 st.error("Aucun fichier Excel trouvé dans le dossier compressé.")
                 return None, None, None, None, None
-            excel_data = pd.ExcelFile(excel_file_path)
             required_sheets = {"CSV", "Vidéo", "Poste", "Constante"}
-            missing_sheets = required_sheets - set(excel_data.sheet_names)
+            missing_sheets = dataset.missing_sheets(required_sheets)
             if missing_sheets:
                 st.error(
                     f"Le fichier Excel doit contenir les feuilles suivantes : {', '.join(required_sheets)}. "
                     f"Feuilles manquantes : {', '.join(missing_sheets)}"
                 )
                 return None, None, None, None, None
-            data = excel_data.parse("CSV")
-            video_data = excel_data.parse("Vidéo")
-            positions = excel_data.parse("Poste")
-            constante_data = excel_data.parse("Constante")
-            return data, video_data, positions, constante_data, base_folder
+            st.caption(format_load_timings(dataset.timings))
+            return dataset.data, dataset.video_data, dataset.positions, dataset.constante_data, dataset
         except Exception as e:
             st.error(f"Erreur lors du chargement du dossier : {e}")
             return None, None, None, None, None
@@ -81,71 +69,30 @@ def load_folder():
         st.info("Veuillez charger un dossier compressé (ZIP) pour continuer.")
     return None, None, None, None, None
 
-def get_text_color_from_image(image_path):
-    """Détermine si le texte doit être blanc ou noir en fonction de la luminosité de l'image d'arrière-plan."""
-    with Image.open(image_path) as img:
-        img = img.convert("L")
-        brightness = sum(img.getdata()) / len(img.getdata())
-        return "255,255,255" if brightness < 128 else "0,0,0"
-
-def get_dominant_color_from_region(bg_image_path, x_mm, y_mm, w_mm, h_mm, page_width_mm=297, page_height_mm=210):
-    """
-    Extrait la couleur dominante de la zone de l'image d'arrière-plan correspondant à
-    la zone définie par (x_mm, y_mm, w_mm, h_mm) en mm, en supposant que l'image est
-    étirée sur une page de dimensions page_width_mm x page_height_mm.
-    La couleur est retournée sous la forme (R, G, B, 255).
-    """
-    from PIL import Image
-    with Image.open(bg_image_path) as img:
-        bg_width, bg_height = img.size
-        left = int((x_mm / page_width_mm) * bg_width)
-        top = int((y_mm / page_height_mm) * bg_height)
-        region_width = int((w_mm / page_width_mm) * bg_width)
-        region_height = int((h_mm / page_height_mm) * bg_height)
-        region = img.crop((left, top, left + region_width, top + region_height)).convert("RGB")
-        small_region = region.resize((50, 50))
-        colors = small_region.getcolors(50 * 50)
-        if colors:
-            dominant_color = max(colors, key=lambda item: item[0])[1]
-            return (dominant_color[0], dominant_color[1], dominant_color[2], 255)
-    return (255, 255, 255, 255)
-
-def get_player_portrait(player_name, positions, base_folder, target_width_mm):
+def get_player_portrait(player_name, positions, dataset, target_width_mm):
     """
-    Ouvre l'image du joueur, la redimensionne pour que sa largeur soit target_width_mm,
-    et retourne l'image redimensionnée ainsi que sa hauteur en mm.
+    Retourne le portrait du joueur redimensionné à la largeur target_width_mm, ainsi que
+    sa hauteur en mm. Le portrait est une vignette préparée au premier appel puis gardée
+    en cache (voir thumbnails) : ni décodage ni redimensionnement aux appels suivants.
     """
-    import os
-    from PIL import Image
-    trombi_folder = os.path.join(base_folder, "Trombi")
-    positions["Joueur_norm"] = positions["Joueur"].astype(str).str.strip().str.lower()
-    selected_norm = str(player_name).strip().lower()
-    player_row = positions[positions["Joueur_norm"] == selected_norm]
-    if player_row.empty:
+    portrait = _player_portrait(player_name, dataset, target_width_mm)
+    if portrait is None:
         return None, None
-    file_name = player_row.iloc[0]["Trombi"]
+    return portrait.pdf_image, portrait.pdf_height_mm
+
+def _player_portrait(player_name, dataset, target_width_mm):
+    player_row = dataset.index.poste_row_normalized(player_name)
+    if player_row is None:
+        return None
+    file_name = player_row.get("Trombi")
     if not file_name:
-        return None, None
-    photo_path = os.path.join(trombi_folder, file_name)
-    if not os.path.exists(photo_path):
-        return None, None
-    with Image.open(photo_path) as img:
-        img = img.convert("RGBA")
-        # Calculer la largeur en pixels correspondant à target_width_mm (en supposant 96 DPI)
-        target_width_px = int(target_width_mm * (96 / 25.4))
-        # Calculer le facteur de redimensionnement
-        factor = target_width_px / img.width
-        new_width = target_width_px
-        new_height = int(img.height * factor)
-        img_resized = img.resize((new_width, new_height), Image.LANCZOS)
-        # Convertir la hauteur en mm
-        new_height_mm = new_height * 25.4 / 96
-        return img_resized, new_height_mm
+        return None
+    return dataset.portrait(file_name, pdf_width_mm=target_width_mm)
 
-def generate_report_with_background(selected_graphs, player_name, constants, player_data, positions, module, background_image, base_folder):
+def generate_report_with_background(selected_graphs, player_name, constants, player_data, positions, module, background_image, dataset, cache_key=None, renderer=None):
     """
     Génère un rapport PDF en mode paysage avec :
-      - Un arrière-plan personnalisé (si fourni)
+      - Un arrière-plan personnalisé (si fourni, préparé par backgrounds.prepare_background)
       - Le titre et les infos du joueur
       - Un sommaire des graphiques
       - Le portrait du joueur inséré à un emplacement précis,
@@ -153,26 +100,36 @@ def generate_report_with_background(selected_graphs, player_name, constants, pla
     
     Le portrait est redimensionné à la largeur target_width_mm, et son bord inférieur
     est aligné à bottom_y_mm (les valeurs sont modifiables).
+    cache_key permet de réutiliser les figures déjà affichées (voir figure_cache.plot_cached).
+    Les graphiques sont dessinés en vectoriel dans le PDF (pdf_charts). Avec
+    RAPPORT_PDF_CHARTS=png, ou pour une figure non prise en charge, ils sont rastérisés par le
+    pool de rendu (pdf_render), ou par renderer s'il est fourni, et insérés depuis la mémoire.
     """
     from PFtest import plot_feminine_graph
     from PMtest import plot_masculine_graph
-    from io import BytesIO
-    import base64, tempfile, os
+    from figure_cache import plot_cached
     from fpdf import FPDF
+    from movement import peak_rows
+    from pdf_render import CHART_BACKEND, add_image_bytes, get_renderer_pool
+    from pdf_charts import draw_figure, supports_figure
+    from workspace import session_workspace
 
     # Paramètres pour le portrait
     target_width_mm = 60      # Largeur souhaitée pour le portrait (modifiable)
     bottom_y_mm = 65          # Coordonnée y (en mm) où doit se trouver le bas du portrait
 
+    workspace = session_workspace()
     temp_pdf_path = None
+    start = time.perf_counter()
     try:
         pdf = FPDF(orientation="L", unit="mm", format="A4")
-        pdf.set_compression(False)
         pdf.add_page()
 
         if background_image:
-            pdf.image(background_image, x=0, y=0, w=297, h=210)
-            text_color = get_text_color_from_image(background_image)
+            # Une seule ressource image, réutilisée par toutes les pages
+            background_name = background_image.register(pdf)
+            pdf.image(background_name, x=0, y=0, w=297, h=210)
+            text_color = background_image.text_color
         else:
             text_color = "0,0,0"
         r, g, b = map(int, text_color.split(","))
@@ -181,8 +138,7 @@ def generate_report_with_background(selected_graphs, player_name, constants, pla
         pdf.set_font("Arial", style="B", size=20)
         pdf.cell(0, 20, "Rapport de Performance en match", align="C", ln=True)
         pdf.set_font("Arial", size=16)
-        position_row = positions[positions["Joueur"] == player_name]
-        player_position = position_row.iloc[0]["Poste"] if not position_row.empty else "Non spécifié"
+        player_position = dataset.index.position_of(player_name, default="Non spécifié")
         pdf.cell(0, 10, f"{player_name} ({player_position})", align="C", ln=True)
         pdf.ln(5)
 
@@ -192,100 +148,124 @@ def generate_report_with_background(selected_graphs, player_name, constants, pla
         for idx, graph in enumerate(selected_graphs, start=1):
             pdf.cell(0, 8, f"{idx}. {graph}", align="C", ln=True)
 
-        # Récupération et redimensionnement du portrait
-        portrait_img, portrait_height_mm = get_player_portrait(player_name, positions, base_folder, target_width_mm)
-        if portrait_img is not None:
+        # Portrait déjà redimensionné et encodé (vignette PDF préparée au chargement)
+        portrait = _player_portrait(player_name, dataset, target_width_mm)
+        if portrait is not None:
             # Pour aligner le bas du portrait à bottom_y_mm, calculer la position y de l'image
-            top_y_mm = bottom_y_mm - portrait_height_mm
-            # Sauvegarder l'image redimensionnée dans un fichier temporaire
-            buffer = BytesIO()
-            portrait_img.save(buffer, format="PNG")
-            img_bytes = buffer.getvalue()
-            composite_path = tempfile.NamedTemporaryFile(delete=False, suffix=".png").name
-            with open(composite_path, "wb") as f:
-                f.write(img_bytes)
+            top_y_mm = bottom_y_mm - portrait.pdf_height_mm
+            # Enregistrer le PNG comme ressource du PDF, sans fichier temporaire
+            add_image_bytes(pdf, "portrait", portrait.pdf_png)
             # Insérer le portrait dans le PDF : x fixe (ici 230 mm), y calculé pour aligner le bas
-            pdf.image(composite_path, x=230, y=top_y_mm, w=target_width_mm, type="PNG")
-            os.remove(composite_path)
+            pdf.image("portrait", x=230, y=top_y_mm, w=target_width_mm, type="PNG")
         else:
             st.error("Le portrait du joueur n'a pas pu être chargé.")
 
         pdf.ln(10)
 
+        # Construction des figures ; seules celles qui ne sont pas dessinées en vectoriel sont rendues en PNG
+        figures = {}
+        for graph in selected_graphs:
+            # Pics d'intensité : sessions sans valeur vidéo retirées (pas de 0 fictif)
+            graph_data = peak_rows(player_data, graph)
+            if graph_data.empty:
+                continue
+            if module == "Pôle Féminin":
+                fig = plot_cached(plot_feminine_graph, graph, player_name, constants, graph_data, positions,
+                                  index=dataset.index, key=cache_key)
+            else:
+                fig = plot_cached(plot_masculine_graph, graph, player_name, constants, graph_data, positions,
+                                  index=dataset.index, key=cache_key)
+            if fig:
+                fig.update_layout(xaxis_tickangle=45)
+                figures[graph] = fig
+        to_rasterize = [graph for graph, fig in figures.items()
+                        if CHART_BACKEND == "png" or not supports_figure(fig)]
+        rendered = {}
+        if to_rasterize:
+            renderer = renderer or get_renderer_pool()
+            rendered = dict(zip(to_rasterize, renderer.render_many(
+                [figures[graph] for graph in to_rasterize], width=800, height=600, scale=2
+            )))
+
         # Insertion des graphiques (2 par page)
         graph_pairs = [selected_graphs[i:i+2] for i in range(0, len(selected_graphs), 2)]
         for graph_pair in graph_pairs:
             pdf.add_page()
             if background_image:
-                pdf.image(background_image, x=0, y=0, w=297, h=210)
+                pdf.image(background_name, x=0, y=0, w=297, h=210)
                 r, g, b = map(int, text_color.split(","))
                 pdf.set_text_color(r, g, b)
             x_offsets = [10, 155]
             for i, graph in enumerate(graph_pair):
-                if module == "Pôle Féminin":
-                    fig = plot_feminine_graph(graph, player_name, constants, player_data, positions)
-                else:
-                    fig = plot_masculine_graph(graph, player_name, constants, player_data, positions)
-                if fig:
-                    fig.update_layout(xaxis_tickangle=45)
-                    temp_image = tempfile.NamedTemporaryFile(delete=False, suffix=".png").name
-                    fig.write_image(temp_image, scale=2, width=800, height=600)
-                    pdf.image(temp_image, x=x_offsets[i], y=60, w=135, type="PNG")
-                    os.remove(temp_image)
+                if graph in rendered:
+                    image_name = add_image_bytes(pdf, f"graph_{graph}", rendered[graph])
+                    pdf.image(image_name, x=x_offsets[i], y=60, w=135, type="PNG")
+                elif graph in figures:
+                    # Même emprise que les PNG 800x600 : 135 mm de large, ratio 4:3
+                    draw_figure(pdf, figures[graph], x_offsets[i], 60, 135, 101.25)
                 else:
                     st.error(f"Graphique {graph} non disponible.")
         
-        temp_pdf_path = tempfile.NamedTemporaryFile(delete=False, suffix=f"_{player_name}.pdf").name
+        temp_pdf_path = workspace.new_file(suffix=f"_{player_name}.pdf")
         pdf.output(temp_pdf_path)
+        workspace.commit(temp_pdf_path)
         st.write("PDF généré :", temp_pdf_path)
+        st.caption(f"Rapport : {os.path.getsize(temp_pdf_path) / 1024:.0f} Ko, généré en {time.perf_counter() - start:.2f} s")
         return temp_pdf_path
     except Exception as e:
         st.error(f"Erreur lors de la génération du rapport PDF : {e}")
         return None
 
-def display_selected_graphs(selected_graphs, player_name, constants, player_data, positions, module):
+def display_selected_graphs(selected_graphs, player_name, constants, player_data, positions, module, index=None, cache_key=None):
     """
     Affiche les graphiques sélectionnés de manière interactive en utilisant Plotly.
+    Si index est fourni, player_data est la tranche du joueur issue de index.rows.
+    Avec cache_key, les figures inchangées sont servies par figure_cache.
     """
     from PFtest import plot_feminine_graph
     from PMtest import plot_masculine_graph
+    from figure_cache import plot_cached
+    from movement import peak_rows
 
     for graph in selected_graphs:
         st.subheader(f"Graphique : {graph}")
+        graph_data = peak_rows(player_data, graph)
+        if graph_data.empty:
+            st.info(f"Aucune session avec positions vidéo pour {graph}.")
+            continue
         if module == "Pôle Féminin":
-            fig = plot_feminine_graph(graph, player_name, constants, player_data, positions)
+            fig = plot_cached(plot_feminine_graph, graph, player_name, constants, graph_data, positions,
+                              index=index, key=cache_key)
         else:
-            fig = plot_masculine_graph(graph, player_name, constants, player_data, positions)
+            fig = plot_cached(plot_masculine_graph, graph, player_name, constants, graph_data, positions,
+                              index=index, key=cache_key)
         if fig:
             fig.update_layout(xaxis_tickangle=45)
             st.plotly_chart(fig)
         else:
             st.error(f"Graphique {graph} non disponible.")
 
-def display_player_photo(selected_player, positions, base_folder):
+def display_player_photo(selected_player, positions, dataset):
     """
     Récupère et affiche la photo du joueur à partir du dossier "Trombi" au format PNG.
+    La vignette d'affichage est préparée au premier affichage puis gardée en cache (voir thumbnails).
     """
     if "Trombi" not in positions.columns:
         st.error("La colonne 'Trombi' n'existe pas dans la feuille Poste.")
         return
-    selected_norm = str(selected_player).strip().lower()
-    positions["Joueur_norm"] = positions["Joueur"].astype(str).str.strip().str.lower()
-    player_row = positions[positions["Joueur_norm"] == selected_norm]
-    if player_row.empty:
+    player_row = dataset.index.poste_row_normalized(selected_player)
+    if player_row is None:
         st.warning("Aucune donnée de photo pour ce joueur.")
         return
-    file_name = player_row.iloc[0]["Trombi"]
+    file_name = player_row.get("Trombi")
     if not file_name:
         st.warning("Aucune photo disponible pour ce joueur.")
         return
-    image_path = os.path.join(base_folder, "Trombi", file_name)
-    if not os.path.exists(image_path):
-        st.error(f"Le fichier image n'existe pas : {image_path}")
+    if not dataset.has_trombi(file_name):
+        st.error(f"Le fichier image n'existe pas dans l'archive : Trombi/{file_name}")
         return
     try:
-        with open(image_path, "rb") as img_file:
-            image_bytes = img_file.read()
+        image_bytes = dataset.portrait(file_name).display_png
     except Exception as e:
         st.error(f"Erreur lors de la lecture du fichier image: {e}")
         return
@@ -298,9 +278,19 @@ def display_player_photo(selected_player, positions, base_folder):
     st.markdown(html, unsafe_allow_html=True)
 
 def main():
-    data, video_data, positions, constante_data, base_folder = load_folder()
+    from workspace import session_workspace
+    from figure_cache import format_figure_cache_stats
+    from pdf_render import start_renderer_pool
+    from metrics import REPORT_GRAPHS
+    from backgrounds import prepare_background, format_background_stats
+
+    # Préchauffe les processus de rendu des graphiques PDF en arrière-plan (sans effet s'ils tournent déjà)
+    start_renderer_pool()
+
+    workspace = session_workspace()
+    data, video_data, positions, constante_data, dataset = load_folder()
     st.write("Le dossier compressé doit contenir un fichier Excel avec les feuilles 'CSV', 'Vidéo', 'Poste', et 'Constante'.")
-    if data is not None and video_data is not None and positions is not None and constante_data is not None and base_folder is not None:
+    if data is not None and video_data is not None and positions is not None and constante_data is not None and dataset is not None:
         tab1, tab2 = st.tabs(["GPS", "Vidéo"])
         
         # Onglet GPS
@@ -308,22 +298,22 @@ def main():
             background_file = st.file_uploader("Télécharger un fichier d'arrière-plan (PNG)", type=["png"])
             background_image = None
             if background_file is not None:
-                background_image = tempfile.NamedTemporaryFile(delete=False, suffix=".png").name
-                with open(background_image, "wb") as f:
-                    f.write(background_file.getvalue())
+                # Réduit, réencodé et analysé une seule fois par contenu, partagé par tous les rapports
+                background_image = prepare_background(background_file.getvalue())
+                st.caption(format_background_stats(background_image))
             
             col1, col2 = st.columns([0.5, 0.5])
             with col1:
                 module = st.selectbox("Choisir le module d'analyse", ["Pôle Féminin", "Pôle Masculin"])
-                selected_player = st.selectbox("Sélectionner un joueur/joueuse", data["Joueur"].drop_duplicates().tolist())
+                selected_player = st.selectbox("Sélectionner un joueur/joueuse", dataset.index.players)
             with col2:
                 if selected_player:
-                    display_player_photo(selected_player, positions, base_folder)
+                    display_player_photo(selected_player, positions, dataset)
             
             debug_composite = st.checkbox("Afficher l'image composite (debug)", value=False)
             if selected_player and debug_composite:
                 # Ici, on affiche simplement le portrait redimensionné avec alignement par le bas
-                portrait_img, portrait_height_mm = get_player_portrait(selected_player, positions, base_folder, target_width_mm=60)
+                portrait_img, portrait_height_mm = get_player_portrait(selected_player, positions, dataset, target_width_mm=60)
                 if portrait_img is not None:
                     st.image(portrait_img, caption="Portrait du joueur redimensionné", width=200)
                 else:
@@ -334,41 +324,10 @@ def main():
                 if module == "Pôle Féminin":
                     from PFtest import get_feminine_constants
                     constants = get_feminine_constants(constante_data)
-                    general_graphs = [
-                        "Distance",
-                        "Distance>19km/h",
-                        "Distance > 23km/h",
-                        "TopSpeed",
-                        "Accélérations > 2m/s²",
-                        "Décélérations > 2m/s²",
-                        "Diagramme empilé"
-                    ]
-                    per_min_graphs = [
-                        "Dist/min",
-                        "Distance>23kmh/min",
-                        "Distance > 19kmh/min",
-                        "Nb Accélération > 2m/s²/min",
-                        "Nb Décélération > 2m/s²/min"
-                    ]
                 else:
                     from PMtest import get_masculine_constants
                     constants = get_masculine_constants(constante_data)
-                    general_graphs = [
-                        "Distance",
-                        "Distance > 16km/h",
-                        "Distance > 20km/h",
-                        "TopSpeed",
-                        "Nb Acc/Dec > 2m/s²",
-                        "Nb Acc/Dec > 4m/s²",
-                        "Diagramme empilé"
-                    ]
-                    per_min_graphs = [
-                        "Dist/min",
-                        "Distance>20kmh/min",
-                        "Distance>16kmh/min",
-                        "Nb Acc/Dec > 2m/s²/min",
-                        "Nb Acc/Dec > 4m/s²/min"
-                    ]
+                general_graphs, per_min_graphs = REPORT_GRAPHS[module]
     
                 col1, col2 = st.columns([0.5, 0.5])
                 with col1:
@@ -386,25 +345,34 @@ def main():
                         default=per_min_graphs if select_all_per_min else []
                     )
     
-                selected_graphs = selected_general_graphs + selected_per_min_graphs
+                selected_peak_graphs = []
+                if dataset.tracks is not None:
+                    from movement import peak_graphs, with_peak_windows
+                    # Pics d'intensité (fenêtres glissantes de 1, 3 et 5 min) calculés sur les positions vidéo
+                    selected_peak_graphs = st.multiselect("Choisir les pics d'intensité (vidéo)", peak_graphs(module))
+
+                selected_graphs = selected_general_graphs + selected_per_min_graphs + selected_peak_graphs
                 filter_matches = st.checkbox("Afficher les matchs < 3900 secondes", value=False)
-                player_data = data[data["Joueur"] == selected_player]
-                if not filter_matches:
-                    def filter_duration(player_data, min_duration=3900):
-                        return player_data[player_data["Durée"] >= min_duration]
-                    player_data = filter_duration(player_data)
+                # Tranches précalculées par l'index : tous les matchs ou seulement ceux >= 3900 s
+                min_duration = None if filter_matches else 3900
+                player_data = dataset.index.rows(selected_player, min_duration=min_duration)
+                if selected_peak_graphs:
+                    player_data = with_peak_windows(player_data, dataset, module)
+                cache_key = (dataset.digest, min_duration)
     
                 if player_data.empty:
                     st.warning("Aucune donnée à afficher après le filtrage.")
                 else:
                     if selected_graphs:
                         st.write("**Graphiques sélectionnés :**")
-                        display_selected_graphs(selected_graphs, selected_player, constants, player_data, positions, module)
+                        display_selected_graphs(selected_graphs, selected_player, constants, player_data, positions, module,
+                                                index=dataset.index, cache_key=cache_key)
+                        st.caption(format_figure_cache_stats())
     
                     if st.button("Générer le rapport PDF"):
                         temp_pdf_path = generate_report_with_background(
                             selected_graphs, selected_player, constants, player_data, positions, module,
-                            background_image, base_folder
+                            background_image, dataset, cache_key=cache_key
                         )
                         if temp_pdf_path:
                             with open(temp_pdf_path, "rb") as pdf_file:
@@ -413,15 +381,40 @@ def main():
                                     data=pdf_file, 
                                     file_name=f"rapport_{selected_player}.pdf"
                                 )
-                        if temp_pdf_path and os.path.exists(temp_pdf_path):
-                            os.remove(temp_pdf_path)
-                        if background_image and os.path.exists(background_image):
-                            os.remove(background_image)
+                        if temp_pdf_path:
+                            workspace.remove(temp_pdf_path)
+
+                if selected_graphs and st.button("Générer les rapports de toute l'équipe"):
+                    from batch_reports import generate_squad_reports, format_summary
+                    progress = st.progress(0.0, text="Génération des rapports...")
+
+                    def update_progress(done, total, player, error, seconds):
+                        status = f" (échec : {error})" if error else ""
+                        progress.progress(done / total, text=f"[{done}/{total}] {player} : {seconds:.1f} s{status}")
+
+                    archive_path = workspace.new_file(suffix=".zip")
+                    summary = generate_squad_reports(
+                        dataset.zip_bytes, module, selected_graphs, archive_path,
+                        background_bytes=background_file.getvalue() if background_file is not None else None,
+                        min_duration=min_duration, on_progress=update_progress
+                    )
+                    workspace.commit(archive_path)
+                    st.caption(format_summary(summary))
+                    for player, error in summary["failed"]:
+                        st.warning(f"Rapport non généré pour {player} : {error}")
+                    if summary["generated"]:
+                        with open(archive_path, "rb") as archive_file:
+                            st.download_button(
+                                "Télécharger les rapports (ZIP)",
+                                data=archive_file,
+                                file_name=f"rapports_{module}.zip"
+                            )
+                    workspace.remove(archive_path)
 
         # Onglet Vidéo
         with tab2:
             st.header("Vidéo")
-            from scipy.ndimage import gaussian_filter
+            from heatmaps import HEATMAP_CELL_SIZES, DEFAULT_CELL_SIZE, aggregate_heatmap, session_heatmap, heatmap_figure
             col1, col2 = st.columns(2)
             with col1:
                 player_name_video = st.selectbox("Sélectionnez un joueur", options=video_data["Joueur"].dropna().unique())
@@ -429,84 +422,102 @@ def main():
                 session_name = st.selectbox("Sélectionnez une session", options=video_data["Session Title"].unique())
 
             if player_name_video and session_name:
-                player_video_data = video_data[
-                    (video_data["Joueur"] == player_name_video) & 
-                    (video_data["Session Title"] == session_name)
-                ]
+                player_video_data = dataset.index.video_rows(player_name_video, session_name)
                 if player_video_data.empty:
                     st.warning("Aucune donnée disponible pour ce joueur et cette session.")
                 else:
-                    module_video = st.selectbox("Choisir le module d'analyse", options=["Carte de chaleur", "Analyse vidéo"])
+                    module_video = st.selectbox("Choisir le module d'analyse", options=["Carte de chaleur", "Analyse vidéo", "Indicateurs de course"])
                     if module_video == "Carte de chaleur":
+                        scope = st.radio(
+                            "Périmètre",
+                            ["Session", "Saison du joueur", "Sélection de sessions", "Équipe (session)"],
+                            horizontal=True
+                        )
+                        player_sessions = dataset.index.video_sessions(player_name_video)
+                        if scope == "Saison du joueur":
+                            pairs = [(player_name_video, session) for session in player_sessions]
+                        elif scope == "Sélection de sessions":
+                            selected_sessions = st.multiselect(
+                                "Sessions cumulées", options=player_sessions, default=[session_name]
+                            )
+                            pairs = [(player_name_video, session) for session in selected_sessions]
+                        elif scope == "Équipe (session)":
+                            pairs = [(player, session_name) for player in dataset.index.video_players(session_name)]
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            cell_size = st.select_slider(
+                                "Résolution de la grille (m)", options=list(HEATMAP_CELL_SIZES), value=DEFAULT_CELL_SIZE
+                            )
+                        with col2:
+                            # Image PNG légère par défaut ; le mode interactif affiche les valeurs au survol
+                            interactive = st.toggle("Carte interactive (sous-échantillonnée)", value=False)
                         try:
-                            x_raw = player_video_data.iloc[0]["X"]
-                            y_raw = player_video_data.iloc[0]["Y"]
-                            if isinstance(x_raw, str):
-                                x_coords = list(map(float, x_raw.split(";")))
-                            elif isinstance(x_raw, (list, np.ndarray)):
-                                x_coords = list(map(float, x_raw))
+                            summary = None
+                            if scope == "Session":
+                                heatmap = session_heatmap(dataset, player_name_video, session_name, cell_size)
                             else:
-                                x_coords = [float(x_raw)]
-                            if isinstance(y_raw, str):
-                                y_coords = list(map(float, y_raw.split(";")))
-                            elif isinstance(y_raw, (list, np.ndarray)):
-                                y_coords = list(map(float, y_raw))
-                            else:
-                                y_coords = [float(y_raw)]
-                            if len(x_coords) != len(y_coords):
-                                st.error(
-                                    f"Les longueurs des coordonnées X ({len(x_coords)}) et Y ({len(y_coords)}) ne correspondent pas."
+                                # Cumul incrémental : seules les sessions ajoutées ou retirées sont recalculées
+                                scope_key = (scope, session_name if scope == "Équipe (session)" else player_name_video)
+                                heatmap, summary = aggregate_heatmap(dataset, pairs, scope_key, cell_size)
+                            fig, payload_bytes, render_seconds = heatmap_figure(heatmap, interactive=interactive)
+                            st.plotly_chart(fig)
+                            ny, nx = heatmap.z.shape
+                            caption = (
+                                f"{heatmap.points} points, grille {nx} x {ny}, calculée en {heatmap.seconds * 1000:.1f} ms ; "
+                                f"rendu {'interactif' if interactive else 'PNG'} : {payload_bytes / 1024:.0f} Ko envoyés, "
+                                f"préparé en {render_seconds * 1000:.1f} ms"
+                            )
+                            if summary is not None:
+                                caption = (
+                                    f"{summary['sessions']} session(s) cumulée(s) (+{summary['added']} / "
+                                    f"-{summary['removed']} en {summary['seconds'] * 1000:.1f} ms) ; " + caption
                                 )
-                                x_coords, y_coords = [], []
-                            heatmap = np.zeros((945, 612))
-                            influence_radius = 1
-                            sigma = influence_radius / (105 / 945)
-                            for x, y in zip(x_coords, y_coords):
-                                x_pixel = int((x / 105) * 945)
-                                y_pixel = int((y / 68) * 612)
-                                if 0 <= x_pixel < 945 and 0 <= y_pixel < 612:
-                                    heatmap[y_pixel, x_pixel] += 1
-                            heatmap = gaussian_filter(heatmap, sigma=sigma)
-                            if np.max(heatmap) > 0:
-                                heatmap /= np.max(heatmap)
-                            fig = go.Figure()
-                            fig.add_trace(go.Heatmap(
-                                z=heatmap.T,
-                                x=np.linspace(0, 105, 945),
-                                y=np.linspace(0, 68, 612),
-                                colorscale=[(0, "white"), (0.5, "blue"), (1, "red")],
-                                zmin=0,
-                                opacity=0.8,
-                                showscale=False
-                            ))
-                            shapes = [
-                                dict(type="rect", x0=0, y0=0, x1=105, y1=68, line=dict(color="black", width=2)),
-                                dict(type="line", x0=52.5, y0=0, x1=52.5, y1=68, line=dict(color="black", width=2, dash="dash")),
-                                dict(type="circle", xref="x", yref="y", 
-                                     x0=52.5-9.15, y0=34-9.15, x1=52.5+9.15, y1=34+9.15, 
-                                     line=dict(color="black", width=2)),
-                                dict(type="rect", x0=0, y0=13.84, x1=16.5, y1=54.16, line=dict(color="black", width=2)),
-                                dict(type="rect", x0=88.5, y0=13.84, x1=105, y1=54.16, line=dict(color="black", width=2)),
-                                dict(type="rect", x0=-2, y0=30.34, x1=0, y1=37.66, line=dict(color="black", width=3)),
-                                dict(type="rect", x0=105, y0=30.34, x1=107, y1=37.66, line=dict(color="black", width=3)),
-                                dict(type="rect", x0=0, y0=24.84, x1=5.5, y1=43.16, line=dict(color="black", width=2)),
-                                dict(type="rect", x0=99.5, y0=24.84, x1=105, y1=43.16, line=dict(color="black", width=2)),
-                                dict(type="circle", xref="x", yref="y", x0=11-0.4, y0=34-0.4, x1=11+0.4, y1=34+0.4, 
-                                     line=dict(color="black", width=2)),
-                                dict(type="circle", xref="x", yref="y", x0=94-0.4, y0=34-0.4, x1=94+0.4, y1=34+0.4, 
-                                     line=dict(color="black", width=2))
-                            ]
-                            fig.update_layout(
-                                shapes=shapes,
-                                xaxis=dict(range=[0, 105], showgrid=False, zeroline=False, 
-                                           showticklabels=False, visible=False, scaleanchor="y"),
-                                yaxis=dict(range=[0, 68], showgrid=False, zeroline=False, 
-                                           showticklabels=False, visible=False, scaleanchor="x"),
-                                margin=dict(l=0, r=0, t=0, b=0)
+                                for (player, session), message in summary["errors"].items():
+                                    st.warning(f"{player} - {session} ignorée : {message}")
+                            st.caption(caption)
+                        except Exception as e:
+                            st.error(f"Erreur lors de la génération de la carte de chaleur : {e}")
+                    elif module_video == "Analyse vidéo":
+                        from replay import replay_figure, track_duration
+                        from tracks import TRACK_SAMPLE_HZ
+                        try:
+                            if dataset.tracks is None:
+                                raise ValueError("La feuille Vidéo ne contient pas de colonnes X et Y.")
+                            # Vues sur les positions décodées au chargement : une fenêtre n'est qu'une tranche
+                            x_track, y_track = dataset.tracks.track(player_name_video, session_name)
+                            duration_min = max(track_duration(x_track) / 60, 0.1)
+                            window = st.slider(
+                                "Fenêtre de temps (min)", min_value=0.0, max_value=round(duration_min, 1),
+                                value=(0.0, round(duration_min, 1)), step=0.1
                             )
+                            fig, summary = replay_figure(x_track, y_track, window[0] * 60, window[1] * 60)
                             st.plotly_chart(fig)
+                            st.caption(
+                                f"{summary['window_points']} positions dans la fenêtre ({TRACK_SAMPLE_HZ:g} Hz) ; "
+                                f"tracé : {summary['path_points']} points, {summary['frames']} images "
+                                f"(une toutes les {summary['frame_step_seconds']:.1f} s) ; "
+                                f"{summary['payload'] / 1024:.0f} Ko envoyés, préparé en {summary['seconds'] * 1000:.0f} ms"
+                            )
                         except Exception as e:
-                            st.error(f"Erreur lors de la génération de la carte de chaleur : {e}")
+                            st.error(f"Erreur lors de la relecture de la trajectoire : {e}")
+                    elif module_video == "Indicateurs de course":
+                        from movement import compare_with_gps, squad_movement
+                        try:
+                            # Toute l'équipe, toutes les sessions, en une passe (seuils du module choisi dans l'onglet GPS)
+                            movement = squad_movement(dataset, module)
+                            session_movement = movement[movement["Session Title"] == session_name]
+                            st.write(f"Indicateurs calculés sur les positions vidéo ({module}) - {session_name}")
+                            st.dataframe(session_movement.round(1), hide_index=True)
+                            comparison = compare_with_gps(session_movement, data)
+                            if not comparison.empty:
+                                st.write("Comparaison avec la feuille CSV (GPS)")
+                                st.dataframe(comparison.round(1), hide_index=True)
+                            st.caption(
+                                f"{len(movement)} sessions, {movement.attrs['points']} positions, "
+                                f"calculées en {movement.attrs['seconds']:.2f} s"
+                            )
+                        except Exception as e:
+                            st.error(f"Erreur lors du calcul des indicateurs de course : {e}")
     else:
         st.warning("Veuillez charger un dossier compressé (ZIP) pour continuer.")
 
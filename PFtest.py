@@ -5,6 +5,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 import tempfile
 import os
+from player_index import player_position
+from cache import content_hash
+from figure_cache import plot_cached, format_figure_cache_stats
+from metrics import add_derived_metrics, FEMININE
 
 def get_feminine_constants(constante_data):
     """Extrait les constantes spécifiques au pôle féminin à partir d'une feuille Excel."""
@@ -22,37 +26,17 @@ def get_feminine_constants(constante_data):
     return constants
 
 def compute_additional_columns(player_data):
-    """Calcule les colonnes dynamiques nécessaires pour certains graphiques."""
-    if all(col in player_data.columns for col in ["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²"]):
-        player_data["Accélérations > 2m/s²"] = player_data[["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²"]].sum(axis=1)
+    """Calcule les colonnes dynamiques nécessaires pour certains graphiques (registre de metrics.py)."""
+    return add_derived_metrics(player_data, variant=FEMININE)
 
-    if all(col in player_data.columns for col in ["Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²"]):
-        player_data["Décélérations > 2m/s²"] = player_data[["Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²"]].sum(axis=1)
-
-    if "Distance > 19km/h" in player_data.columns:
-        player_data["Distance > 19km/h"] = player_data["Distance > 19km/h"]
-        
-    if "Distance19" in player_data.columns:
-        player_data["Distance > 19kmh/min"] = player_data["Distance19"] / (player_data["Durée"] / 60)
-
-    if "Dist>23kmh" in player_data.columns:
-        player_data["Distance > 23km/h"] = player_data["Dist>23kmh"] * 1000  # Convertir en mètres
-
-    if all(col in player_data.columns for col in ["Dist>23kmh", "Durée"]):
-        player_data["Distance>23kmh/min"] = (player_data["Dist>23kmh"] * 1000) / (player_data["Durée"] / 60)
-
-    if all(col in player_data.columns for col in ["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²", "Durée"]):
-        player_data["Nb Accélération > 2m/s²/min"] = player_data[["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²"]].sum(axis=1) / (player_data["Durée"] / 60)
-    
-    if all(col in player_data.columns for col in ["Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²", "Durée"]):
-        player_data["Nb Décélération > 2m/s²/min"] = player_data[["Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²"]].sum(axis=1) / (player_data["Durée"] / 60)
-
-    return player_data
-
-def plot_feminine_graph(selected_graph, player_name, constants, data, positions):
+def plot_feminine_graph(selected_graph, player_name, constants, data, positions, index=None):
     """Affiche les graphiques féminins pour un joueur donné en utilisant Plotly."""
-    player_data = data[data["Joueur"] == player_name].copy()
-    player_data = compute_additional_columns(player_data)
+    # Les colonnes dérivées sont calculées une fois sur toute la feuille au chargement.
+    # Avec un PlayerIndex, data est déjà la tranche du joueur (index.rows) : pas de nouveau filtrage.
+    if index is not None:
+        player_data = data.copy()
+    else:
+        player_data = data[data["Joueur"] == player_name].copy()
 
     # Cas du diagramme empilé
     if selected_graph == "Diagramme empilé":
@@ -62,9 +46,8 @@ def plot_feminine_graph(selected_graph, player_name, constants, data, positions)
             distance19 = data["Distance19%"].fillna(0)
             distance = data["Distance%"].fillna(0)
 
-            position_row = positions[positions["Joueur"] == player_name]
-            if not position_row.empty:
-                position = position_row.iloc[0]["Poste"]
+            position = player_position(player_name, positions, index)
+            if position is not None:
                 constant23 = constants.get("Distance23%", {}).get(position, 0)
                 constant19 = constants.get("Distance19%", {}).get(position, 0)
                 constant = constants.get("Distance%", {}).get(position, 0)
@@ -127,9 +110,8 @@ def plot_feminine_graph(selected_graph, player_name, constants, data, positions)
             line=dict(color="navy")
         ))
 
-        position_row = positions[positions["Joueur"] == player_name]
-        if not position_row.empty:
-            position = position_row.iloc[0]["Poste"]
+        position = player_position(player_name, positions, index)
+        if position is not None:
             constant_val = constants.get(selected_graph, {}).get(position)
             if constant_val is not None:
                 # Trace de la ligne constante pour la norme U17
@@ -152,28 +134,28 @@ def plot_feminine_graph(selected_graph, player_name, constants, data, positions)
         return None
 
 def load_excel_main():
-    """Charge les données depuis un fichier Excel."""
+    """Charge les données depuis un fichier Excel et renvoie aussi l'empreinte de son contenu."""
     uploaded_file = st.file_uploader("Charger un fichier Excel", type=["xls", "xlsx", "xlsm"])
     if uploaded_file is not None:
         try:
             excel_data = pd.ExcelFile(uploaded_file)
             if "CSV" not in excel_data.sheet_names or "Poste" not in excel_data.sheet_names or "Constante" not in excel_data.sheet_names:
                 st.error("Le fichier Excel doit contenir les feuilles 'CSV', 'Poste' et 'Constante'.")
-                return None, None, None
+                return None, None, None, None
 
-            data = excel_data.parse("CSV")
+            data = compute_additional_columns(excel_data.parse("CSV"))
             positions = excel_data.parse("Poste")
             constante_data = excel_data.parse("Constante")
 
             st.success("Fichier chargé avec succès")
             st.write("Aperçu des données chargées:")
             st.write(data.head())
-            return data, positions, constante_data
+            return data, positions, constante_data, content_hash(uploaded_file.getvalue())
         except Exception as e:
             st.error(f"Erreur lors du chargement du fichier : {e}")
     else:
         st.warning("Veuillez charger un fichier Excel.")
-    return None, None, None
+    return None, None, None, None
 
 def display_selected_graphs_main(selected_graphs, player_name, constants, player_data, positions):
     """Affiche les graphiques de manière interactive pour un joueur en utilisant Plotly."""
@@ -189,7 +171,7 @@ def main():
     st.title("Analyse des Performances des Joueurs/Joueuses")
 
     # Charger les données
-    data, positions, constante_data = load_excel_main()
+    data, positions, constante_data, digest = load_excel_main()
     if data is not None and positions is not None and constante_data is not None:
         st.write("Données disponibles. Sélectionnez un joueur :")
         players = data["Joueur"].drop_duplicates().tolist()
@@ -199,9 +181,8 @@ def main():
         if selected_player:
             st.write(f"Analyse pour : {selected_player}")
 
-            # Calculer les colonnes dynamiques si nécessaires
-            player_data = data[data["Joueur"] == selected_player].copy()
-            player_data = compute_additional_columns(player_data)
+            # Les colonnes dynamiques ont été calculées au chargement
+            player_data = data[data["Joueur"] == selected_player]
 
             # Graphiques généraux
             general_graphs = [
@@ -230,14 +211,17 @@ def main():
             if not player_data.empty:
                 if selected_general_graph:
                     st.subheader("Graphique général")
-                    fig = plot_feminine_graph(selected_general_graph, selected_player, constants, player_data, positions)
+                    fig = plot_cached(plot_feminine_graph, selected_general_graph, selected_player, constants, player_data, positions,
+                                      key=(digest, None))
                     if fig:
                         st.plotly_chart(fig)
                 if selected_per_min_graph:
                     st.subheader("Graphique par minute")
-                    fig = plot_feminine_graph(selected_per_min_graph, selected_player, constants, player_data, positions)
+                    fig = plot_cached(plot_feminine_graph, selected_per_min_graph, selected_player, constants, player_data, positions,
+                                      key=(digest, None))
                     if fig:
                         st.plotly_chart(fig)
+        st.caption(format_figure_cache_stats())
     else:
         st.warning("Veuillez charger un fichier Excel pour commencer.")
 
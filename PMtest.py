@@ -5,6 +5,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 import tempfile
 import os
+from player_index import player_position
+from cache import content_hash
+from figure_cache import plot_cached, format_figure_cache_stats
+from metrics import add_derived_metrics, MASCULINE
 
 def get_masculine_constants(constante_data):
     """Extrait les constantes spécifiques au pôle masculin à partir d'une feuille Excel."""
@@ -22,39 +26,17 @@ def get_masculine_constants(constante_data):
     return constants
 
 def compute_additional_columns(player_data):
-    """Calcule les colonnes dynamiques nécessaires pour certains graphiques."""
-    if "Dist>16kmh" in player_data.columns:
-        player_data["Distance > 16km/h"] = player_data["Dist>16kmh"]
+    """Calcule les colonnes dynamiques nécessaires pour certains graphiques (registre de metrics.py)."""
+    return add_derived_metrics(player_data, variant=MASCULINE)
 
-    if "Dist>20kmh" in player_data.columns:
-        player_data["Distance > 20km/h"] = (player_data["Dist>20kmh"] * 1000)
-
-    if "Dist>20kmh" in player_data.columns and "Durée" in player_data.columns:
-        player_data["Distance>20kmh/min"] = (player_data["Dist>20kmh"] * 1000).fillna(0) / (player_data["Durée"].replace(0, 1) / 60)
-
-    if "Distance16" in player_data.columns and "Durée" in player_data.columns:
-        player_data["Distance>16kmh/min"] = player_data["Distance16"] / (player_data["Durée"].replace(0, 1) / 60)
-
-    if all(col in player_data.columns for col in ["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²", 
-                                                   "Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²"]):
-        player_data["Nb Acc/Dec > 2m/s²"] = player_data[["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²", 
-                                                         "Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²"]].sum(axis=1)
-
-    if "Nb Acc/Dec > 2m/s²" in player_data.columns and "Durée" in player_data.columns:
-        player_data["Nb Acc/Dec > 2m/s²/min"] = player_data["Nb Acc/Dec > 2m/s²"].fillna(0) / (player_data["Durée"].replace(0, 1) / 60)
-
-    if all(col in player_data.columns for col in ["Nb Acc>4m/s²", "Nb Dec>4m/s²"]):
-        player_data["Nb Acc/Dec > 4m/s²"] = player_data[["Nb Acc>4m/s²", "Nb Dec>4m/s²"]].sum(axis=1)
-
-    if "Nb Acc/Dec > 4m/s²" in player_data.columns and "Durée" in player_data.columns:
-        player_data["Nb Acc/Dec > 4m/s²/min"] = player_data["Nb Acc/Dec > 4m/s²"].fillna(0) / (player_data["Durée"].replace(0, 1) / 60)
-
-    return player_data
-
-def plot_masculine_graph(selected_graph, player_name, constants, data, positions):
+def plot_masculine_graph(selected_graph, player_name, constants, data, positions, index=None):
     """Affiche les graphiques masculins pour un joueur donné en utilisant Plotly Express."""
-    player_data = data[data["Joueur"] == player_name].copy()
-    player_data = compute_additional_columns(player_data)
+    # Les colonnes dérivées sont calculées une fois sur toute la feuille au chargement.
+    # Avec un PlayerIndex, data est déjà la tranche du joueur (index.rows) : pas de nouveau filtrage.
+    if index is not None:
+        player_data = data.copy()
+    else:
+        player_data = data[data["Joueur"] == player_name].copy()
 
     # Diagramme empilé
     if selected_graph == "Diagramme empilé":
@@ -64,9 +46,8 @@ def plot_masculine_graph(selected_graph, player_name, constants, data, positions
             distance20 = data["Distance20%"].fillna(0)
             distance = data["Distance%"].fillna(0)
 
-            position_row = positions[positions["Joueur"] == player_name]
-            if not position_row.empty:
-                position = position_row.iloc[0]["Poste"]
+            position = player_position(player_name, positions, index)
+            if position is not None:
                 constant20 = constants.get("Distance20%", {}).get(position, 0)
                 constant16 = constants.get("Distance16%", {}).get(position, 0)
                 constant = constants.get("Distance%", {}).get(position, 0)
@@ -129,9 +110,8 @@ def plot_masculine_graph(selected_graph, player_name, constants, data, positions
         ))
 
         # Trace de la ligne constante si disponible
-        position_row = positions[positions["Joueur"] == player_name]
-        if not position_row.empty:
-            position = position_row.iloc[0]["Poste"]
+        position = player_position(player_name, positions, index)
+        if position is not None:
             constant_val = constants.get(selected_graph, {}).get(position)
             if constant_val is not None:
                 fig.add_trace(go.Scatter(
@@ -153,28 +133,28 @@ def plot_masculine_graph(selected_graph, player_name, constants, data, positions
         return None
 
 def load_excel():
-    """Charge les données depuis un fichier Excel."""
+    """Charge les données depuis un fichier Excel et renvoie aussi l'empreinte de son contenu."""
     uploaded_file = st.file_uploader("Charger un fichier Excel", type=["xls", "xlsx", "xlsm"])
     if uploaded_file is not None:
         try:
             excel_data = pd.ExcelFile(uploaded_file)
             if "CSV" not in excel_data.sheet_names or "Poste" not in excel_data.sheet_names or "Constante" not in excel_data.sheet_names:
                 st.error("Le fichier Excel doit contenir les feuilles 'CSV', 'Poste', et 'Constante'.")
-                return None, None, None
+                return None, None, None, None
 
-            data = excel_data.parse("CSV")
+            data = compute_additional_columns(excel_data.parse("CSV"))
             positions = excel_data.parse("Poste")
             constante_data = excel_data.parse("Constante")
 
             st.success("Fichier chargé avec succès")
             st.write("Aperçu des données chargées:")
             st.write(data.head())
-            return data, positions, constante_data
+            return data, positions, constante_data, content_hash(uploaded_file.getvalue())
         except Exception as e:
             st.error(f"Erreur lors du chargement du fichier : {e}")
     else:
         st.warning("Veuillez charger un fichier Excel.")
-    return None, None, None
+    return None, None, None, None
 
 def display_selected_graphs(selected_graphs, player_name, constants, player_data, positions):
     """Affiche les graphiques de manière interactive pour un joueur en utilisant Plotly."""
@@ -190,7 +170,7 @@ def main():
     st.title("Analyse des Performances des Joueurs Masculins")
 
     # Charger les données
-    data, positions, constante_data = load_excel()
+    data, positions, constante_data, digest = load_excel()
     if data is not None and positions is not None and constante_data is not None:
         constants = get_masculine_constants(constante_data)
         st.write("Données disponibles. Sélectionnez un joueur :")
@@ -200,9 +180,8 @@ def main():
         if selected_player:
             st.write(f"Analyse pour : {selected_player}")
 
-            # Calculer les colonnes dynamiques si nécessaires
-            player_data = data[data["Joueur"] == selected_player].copy()
-            player_data = compute_additional_columns(player_data)
+            # Les colonnes dynamiques ont été calculées au chargement
+            player_data = data[data["Joueur"] == selected_player]
 
             # Graphiques généraux
             general_graphs = [
@@ -229,9 +208,11 @@ def main():
             if not player_data.empty:
                 if selected_graph:
                     st.subheader("Graphique sélectionné")
-                    fig = plot_masculine_graph(selected_graph, selected_player, constants, data, positions)
+                    fig = plot_cached(plot_masculine_graph, selected_graph, selected_player, constants, data, positions,
+                                      key=(digest, None))
                     if fig:
                         st.plotly_chart(fig)
+        st.caption(format_figure_cache_stats())
     else:
         st.warning("Veuillez charger un fichier Excel pour commencer.")
 
@@ -0,0 +1,122 @@
+import io
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from cache import LRUCache, content_hash
+
+PAGE_WIDTH_MM = 297
+PAGE_HEIGHT_MM = 210
+
+# Résolution de l'arrière-plan dans le PDF : au-delà, les pixels ne sont pas visibles à l'impression
+BACKGROUND_DPI = int(os.environ.get("RAPPORT_BACKGROUND_DPI", 150))
+BACKGROUND_JPEG_QUALITY = int(os.environ.get("RAPPORT_BACKGROUND_JPEG_QUALITY", 85))
+# Taille maximale (octets) des arrière-plans préparés gardés en mémoire
+BACKGROUND_CACHE_MAX_BYTES = int(os.environ.get("RAPPORT_BACKGROUND_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+_background_cache = LRUCache(BACKGROUND_CACHE_MAX_BYTES)
+
+
+@dataclass
+class PreparedBackground:
+    """
+    Arrière-plan de rapport préparé une seule fois par contenu : réduit à la résolution de la
+    page, réencodé (JPEG, ou PNG s'il a de la transparence) et accompagné de ses pixels pour
+    les statistiques de couleur.
+    """
+    digest: str
+    content: bytes
+    pixels: np.ndarray
+    source_size: tuple
+    source_bytes: int
+    seconds: float
+
+    @property
+    def name(self):
+        """Nom de la ressource image dans le PDF : toutes les pages partagent la même."""
+        return f"background_{self.digest[:16]}"
+
+    @property
+    def brightness(self):
+        # Luminance ITU-R 601-2, comme la conversion "L" de PIL
+        rgb = self.pixels[:, :, :3].astype(np.float32)
+        return float((rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)).mean())
+
+    @property
+    def text_color(self):
+        """Texte blanc sur fond sombre, noir sinon (format "r,g,b")."""
+        return "255,255,255" if self.brightness < 128 else "0,0,0"
+
+    def dominant_color(self, x_mm, y_mm, w_mm, h_mm, page_width_mm=PAGE_WIDTH_MM, page_height_mm=PAGE_HEIGHT_MM):
+        """
+        Couleur la plus fréquente de la zone (x_mm, y_mm, w_mm, h_mm) de la page, l'image
+        étant étirée sur page_width_mm x page_height_mm. Retourne (R, G, B, 255).
+        """
+        height, width = self.pixels.shape[:2]
+        left = int((x_mm / page_width_mm) * width)
+        top = int((y_mm / page_height_mm) * height)
+        right = left + int((w_mm / page_width_mm) * width)
+        bottom = top + int((h_mm / page_height_mm) * height)
+        region = self.pixels[top:bottom, left:right, :3]
+        if region.size == 0:
+            return (255, 255, 255, 255)
+        # Échantillon de 50 x 50 pixels, comme l'ancienne version (resize puis getcolors)
+        region = np.asarray(Image.fromarray(np.ascontiguousarray(region)).resize((50, 50)))
+        codes = region.reshape(-1, 3).astype(np.uint32) @ np.array([1 << 16, 1 << 8, 1], dtype=np.uint32)
+        values, counts = np.unique(codes, return_counts=True)
+        code = int(values[counts.argmax()])
+        return (code >> 16, (code >> 8) & 0xFF, code & 0xFF, 255)
+
+    def register(self, pdf):
+        """Enregistre l'image dans pdf (une seule fois) et retourne son nom pour pdf.image."""
+        from pdf_render import add_image_bytes
+        return add_image_bytes(pdf, self.name, self.content)
+
+    def nbytes(self):
+        return len(self.content) + self.pixels.nbytes
+
+
+def _prepare(digest, content):
+    start = time.perf_counter()
+    with Image.open(io.BytesIO(content)) as img:
+        source_size = img.size
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        page_size = (round(PAGE_WIDTH_MM / 25.4 * BACKGROUND_DPI), round(PAGE_HEIGHT_MM / 25.4 * BACKGROUND_DPI))
+        if img.width > page_size[0] or img.height > page_size[1]:
+            img = img.resize(page_size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        if has_alpha:
+            img.save(buffer, format="PNG", optimize=True)
+        else:
+            img.save(buffer, format="JPEG", quality=BACKGROUND_JPEG_QUALITY, optimize=True)
+        pixels = np.asarray(img)
+    return PreparedBackground(
+        digest=digest,
+        content=buffer.getvalue(),
+        pixels=pixels,
+        source_size=source_size,
+        source_bytes=len(content),
+        seconds=time.perf_counter() - start,
+    )
+
+
+def prepare_background(content):
+    """
+    Retourne l'arrière-plan préparé pour le contenu d'image content, calculé au premier
+    appel puis partagé (par empreinte SHA-256) par toutes les sessions et tous les rapports.
+    """
+    digest = content_hash(content)
+    return _background_cache.get_or_create(digest, lambda: _prepare(digest, content), sizeof=PreparedBackground.nbytes)
+
+
+def format_background_stats(background):
+    height, width = background.pixels.shape[:2]
+    return (
+        f"Arrière-plan préparé : {background.source_size[0]}x{background.source_size[1]} px, "
+        f"{background.source_bytes / 1024:.0f} Ko -> {width}x{height} px, {len(background.content) / 1024:.0f} Ko "
+        f"({background.seconds:.2f} s)"
+    )
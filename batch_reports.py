@@ -0,0 +1,178 @@
+"""
+Génération des rapports PDF pour toute l'équipe, en parallèle sur plusieurs cœurs.
+
+Utilisable depuis l'onglet GPS d'INVENT ou en ligne de commande :
+    python batch_reports.py saison.zip --module "Pôle Féminin" --background fond.png --output rapports.zip
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from metrics import FEMININE, MASCULINE, REPORT_GRAPHS
+from player_index import MIN_MATCH_DURATION
+
+BATCH_WORKERS = int(os.environ.get("RAPPORT_BATCH_WORKERS", os.cpu_count() or 1))
+
+# Ressources partagées par tous les rapports d'un même processus de génération
+_worker_assets = {}
+
+
+def get_module_constants(module, constante_data):
+    if module == FEMININE:
+        from PFtest import get_feminine_constants
+        return get_feminine_constants(constante_data)
+    from PMtest import get_masculine_constants
+    return get_masculine_constants(constante_data)
+
+
+def _init_worker(zip_bytes, module, background_bytes):
+    """
+    Charge une seule fois par processus le jeu de données (feuilles, métriques dérivées,
+    index), les constantes du pôle et l'arrière-plan préparé, réutilisés pour chaque joueur.
+    """
+    # Hors serveur Streamlit, les appels st.* ne font que journaliser des avertissements
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    from backgrounds import prepare_background
+    from ingestion import load_archive
+    from workspace import session_workspace
+
+    dataset = load_archive(zip_bytes)
+    workspace = session_workspace()
+    _worker_assets.update(
+        dataset=dataset,
+        module=module,
+        constants=get_module_constants(module, dataset.constante_data),
+        workspace=workspace,
+        background=prepare_background(background_bytes) if background_bytes else None,
+    )
+
+
+def _build_player_report(player, selected_graphs, min_duration):
+    """Génère le rapport d'un joueur et retourne (joueur, octets PDF ou None, erreur, durée)."""
+    from INVENT import generate_report_with_background
+    from movement import peak_graphs, with_peak_windows
+    from pdf_render import InProcessRenderer
+
+    start = time.perf_counter()
+    assets = _worker_assets
+    dataset = assets["dataset"]
+    player_data = dataset.index.rows(player, min_duration=min_duration)
+    if player_data.empty:
+        return player, None, "aucune donnée après filtrage", time.perf_counter() - start
+    if dataset.tracks is not None and set(selected_graphs) & set(peak_graphs(assets["module"])):
+        player_data = with_peak_windows(player_data, dataset, assets["module"])
+    pdf_path = generate_report_with_background(
+        selected_graphs, player, assets["constants"], player_data, dataset.positions, assets["module"],
+        assets["background"], dataset, cache_key=(dataset.digest, min_duration), renderer=InProcessRenderer()
+    )
+    if pdf_path is None:
+        return player, None, "échec de la génération du PDF", time.perf_counter() - start
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+    assets["workspace"].remove(pdf_path)
+    return player, pdf_bytes, None, time.perf_counter() - start
+
+
+def report_file_name(player):
+    safe_name = "".join(c if c.isalnum() or c in " -_." else "_" for c in str(player)).strip()
+    return f"rapport_{safe_name}.pdf"
+
+
+def generate_squad_reports(zip_bytes, module, selected_graphs, output, background_bytes=None,
+                           min_duration=MIN_MATCH_DURATION, players=None, workers=BATCH_WORKERS,
+                           on_progress=None):
+    """
+    Génère un rapport par joueur avec generate_report_with_background, réparti sur workers
+    processus, et écrit chaque PDF dans l'archive ZIP output (chemin ou fichier binaire)
+    dès qu'il est prêt. on_progress(done, total, player, error, seconds) est appelé après
+    chaque joueur. Retourne un résumé : rapports générés, échecs, durée totale et débit.
+    """
+    from ingestion import load_archive
+
+    if players is None:
+        players = load_archive(zip_bytes).index.players
+    players = list(players)
+    workers = max(1, min(workers, len(players) or 1))
+    start = time.perf_counter()
+    generated, failed = [], []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(zip_bytes, module, background_bytes),
+    ) as executor, zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        futures = {
+            executor.submit(_build_player_report, player, selected_graphs, min_duration): player for player in players
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                player, pdf_bytes, error, seconds = future.result()
+            except Exception as e:
+                # Processus arrêté ou résultat non transmissible : le joueur est connu par sa tâche
+                player, pdf_bytes, error, seconds = futures[future], None, str(e), 0.0
+            if pdf_bytes is not None:
+                archive.writestr(report_file_name(player), pdf_bytes)
+                generated.append(player)
+            else:
+                failed.append((player, error))
+            if on_progress:
+                on_progress(done, len(players), player, error, seconds)
+    total_seconds = time.perf_counter() - start
+    return {
+        "generated": generated,
+        "failed": failed,
+        "seconds": total_seconds,
+        "reports_per_second": len(generated) / total_seconds if total_seconds > 0 else 0.0,
+        "workers": workers,
+    }
+
+
+def format_summary(summary):
+    return (
+        f"{len(summary['generated'])} rapports générés en {summary['seconds']:.1f} s "
+        f"({summary['reports_per_second']:.2f} rapport/s, {summary['workers']} processus)"
+        + (f", {len(summary['failed'])} échecs" if summary["failed"] else "")
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère les rapports PDF de toute l'équipe dans une archive ZIP.")
+    parser.add_argument("archive", help="ZIP contenant l'Excel (CSV, Vidéo, Poste, Constante) et le dossier Trombi")
+    parser.add_argument("--module", choices=[FEMININE, MASCULINE], default=FEMININE)
+    parser.add_argument("--graphs", nargs="*", help="Graphiques à inclure (par défaut : tous ceux du pôle)")
+    parser.add_argument("--background", help="Image PNG d'arrière-plan")
+    parser.add_argument("--output", default="rapports.zip")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--include-short", action="store_true", help="Inclure les matchs < 3900 secondes")
+    args = parser.parse_args(argv)
+
+    with open(args.archive, "rb") as f:
+        zip_bytes = f.read()
+    background_bytes = None
+    if args.background:
+        with open(args.background, "rb") as f:
+            background_bytes = f.read()
+    general_graphs, per_min_graphs = REPORT_GRAPHS[args.module]
+    selected_graphs = args.graphs or general_graphs + per_min_graphs
+
+    def print_progress(done, total, player, error, seconds):
+        status = f"erreur : {error}" if error else "ok"
+        print(f"[{done}/{total}] {player} : {status} ({seconds:.1f} s)", flush=True)
+
+    summary = generate_squad_reports(
+        zip_bytes, args.module, selected_graphs, args.output, background_bytes=background_bytes,
+        min_duration=None if args.include_short else MIN_MATCH_DURATION, workers=args.workers,
+        on_progress=print_progress,
+    )
+    print(format_summary(summary))
+    print(f"Archive : {args.output}")
+    return 0 if summary["generated"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Cache LRU partagé par tout le processus (donc par toutes les sessions Streamlit),
+    borné par une taille totale (en octets, ou en nombre d'entrées si chaque entrée compte 1).
+    Chaque entrée est stockée avec sa taille ; lorsque le total dépasse max_size,
+    les entrées les moins récemment utilisées sont évincées (on_evict est alors appelé
+    avec la clé et la valeur évincées).
+    """
+
+    def __init__(self, max_size, on_evict=None):
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_size = 0
+        self._lock = threading.RLock()
+        self._key_locks = {}
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_size(self):
+        return self._total_size
+
+    def get(self, key, default=None):
+        """Retourne la valeur associée à key (et la marque comme récemment utilisée)."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size=0):
+        """Ajoute ou remplace une entrée puis évince les plus anciennes si nécessaire."""
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._total_size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total_size += size
+            # On conserve toujours la dernière entrée, même si elle dépasse seule la limite
+            while self._total_size > self.max_size and len(self._entries) > 1:
+                old_key, (old_value, old_size) = self._entries.popitem(last=False)
+                self._total_size -= old_size
+                evicted.append((old_key, old_value))
+        for old_key, old_value in evicted:
+            if self.on_evict:
+                self.on_evict(old_key, old_value)
+        return value
+
+    def get_or_create(self, key, factory, sizeof=None):
+        """
+        Retourne la valeur en cache pour key, ou la construit avec factory().
+        Un verrou par clé garantit que deux sessions qui demandent la même clé
+        en même temps ne la construisent qu'une seule fois.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                        return self._entries[key][0]
+                value = factory()
+                self.put(key, value, sizeof(value) if sizeof else 0)
+        finally:
+            # Retiré aussi si factory() échoue : sinon un verrou reste par chargement raté
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return value
+
+    def pop(self, key, default=None):
+        """Retire une entrée sans appeler on_evict."""
+        with self._lock:
+            if key in self._entries:
+                value, size = self._entries.pop(key)
+                self._total_size -= size
+                return value
+            return default
+
+    def clear(self):
+        with self._lock:
+            evicted = list(self._entries.items())
+            self._entries.clear()
+            self._total_size = 0
+        for key, (value, _) in evicted:
+            if self.on_evict:
+                self.on_evict(key, value)
+
+    def stats(self):
+        """Compteurs de succès/échecs et occupation du cache."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size": self._total_size,
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def content_hash(content):
+    """Empreinte SHA-256 du contenu d'un fichier téléversé."""
+    return hashlib.sha256(content).hexdigest()
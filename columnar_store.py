@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Dossier persistant des fichiers colonnaires (survit aux redémarrages du serveur)
+STORE_DIR = os.environ.get(
+    "RAPPORT_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rapport_joueur", "store")
+)
+
+MANIFEST = "manifest.json"
+SHEET_FILES = {"CSV": "csv.arrow", "Vidéo": "video.arrow", "Poste": "poste.arrow", "Constante": "constante.arrow"}
+# Positions vidéo décodées (voir tracks) : X et Y dans un tableau float32 (2, n) mappable,
+# offsets par ligne de la feuille Vidéo et erreurs par ligne ; TRACK_INDEX est écrit en dernier
+TRACK_FILE = "tracks.npy"
+TRACK_OFFSETS_FILE = "track_offsets.npy"
+TRACK_INDEX = "tracks.json"
+# Colonnes textuelles connues : toujours stockées en chaîne, quel que soit leur contenu
+TEXT_COLUMNS = {"Joueur", "Session Title", "X", "Y", "Poste", "Trombi", "Unnamed: 0"}
+
+
+def _store_path(workbook_hash):
+    return os.path.join(STORE_DIR, workbook_hash)
+
+
+def _explicit_dtypes(df):
+    """
+    Fixe un type explicite pour chaque colonne avant l'écriture :
+    texte pour les colonnes connues ou non numériques, float64/int64 pour le reste.
+    Les colonnes 'object' mélangeant nombres et texte sont converties en nombres si possible.
+    """
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if col in TEXT_COLUMNS:
+            df[col] = series.where(series.isna(), series.astype(str)).astype(object)
+        elif series.dtype == object:
+            try:
+                df[col] = pd.to_numeric(series).astype("float64")
+            except (ValueError, TypeError):
+                df[col] = series.where(series.isna(), series.astype(str)).astype(object)
+        elif pd.api.types.is_bool_dtype(series):
+            continue
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = series.astype("int64")
+        elif pd.api.types.is_float_dtype(series):
+            df[col] = series.astype("float64")
+    # Les noms de colonnes doivent être des chaînes pour Arrow
+    df.columns = [str(col) for col in df.columns]
+    return df
+
+
+def has_sheets(workbook_hash):
+    return os.path.exists(os.path.join(_store_path(workbook_hash), MANIFEST))
+
+
+def _write_tracks(directory, tracks):
+    np.save(os.path.join(directory, TRACK_FILE), np.stack([tracks.x, tracks.y]))
+    np.save(os.path.join(directory, TRACK_OFFSETS_FILE), tracks.offsets)
+    with open(os.path.join(directory, TRACK_INDEX), "w", encoding="utf-8") as f:
+        json.dump({"errors": {str(row): message for row, message in tracks.errors.items()},
+                   "parse_seconds": tracks.seconds}, f, ensure_ascii=False)
+
+
+def write_sheets(workbook_hash, sheets, sheet_names, excel_seconds, tracks=None):
+    """
+    Écrit les feuilles lues depuis l'Excel au format Arrow IPC (non compressé,
+    donc mappable en mémoire), ainsi que les positions vidéo décodées (tracks) s'il y en a.
+    L'écriture se fait dans un dossier temporaire renommé à la fin : un store incomplet
+    n'est jamais visible.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{workbook_hash[:12]}_", dir=STORE_DIR)
+    try:
+        dtypes = {}
+        for sheet, df in sheets.items():
+            df = _explicit_dtypes(df)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            feather.write_feather(table, os.path.join(tmp_dir, SHEET_FILES[sheet]), compression="uncompressed")
+            dtypes[sheet] = {col: str(dtype) for col, dtype in df.dtypes.items()}
+        manifest = {
+            "sheet_names": list(sheet_names),
+            "sheets": list(sheets),
+            "dtypes": dtypes,
+            "excel_seconds": excel_seconds,
+        }
+        if tracks is not None:
+            _write_tracks(tmp_dir, tracks)
+        with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        try:
+            os.replace(tmp_dir, _store_path(workbook_hash))
+        except OSError:
+            # Un autre processus a écrit le même classeur entre-temps
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def read_sheets(workbook_hash):
+    """
+    Relit les feuilles d'un classeur depuis le store. Les fichiers Arrow sont lus par mappage
+    mémoire, mais to_pandas copie chaque colonne : les feuilles relues sont des DataFrames
+    résidents (le gain est d'éviter l'Excel, pas la mémoire). Seules les positions vidéo
+    (voir read_tracks) restent mappées.
+    Retourne (sheets, sheet_names, excel_seconds, store_seconds).
+    """
+    start = time.perf_counter()
+    path = _store_path(workbook_hash)
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    sheets = {}
+    for sheet in manifest["sheets"]:
+        table = feather.read_table(os.path.join(path, SHEET_FILES[sheet]), memory_map=True)
+        sheets[sheet] = table.to_pandas()
+    return sheets, manifest["sheet_names"], manifest.get("excel_seconds"), time.perf_counter() - start
+
+
+def has_tracks(workbook_hash):
+    return os.path.exists(os.path.join(_store_path(workbook_hash), TRACK_INDEX))
+
+
+def write_tracks(workbook_hash, tracks):
+    """Ajoute les positions décodées à un store existant (écrit avant leur prise en charge)."""
+    path = _store_path(workbook_hash)
+    tmp_dir = tempfile.mkdtemp(prefix=".tracks_", dir=path)
+    try:
+        _write_tracks(tmp_dir, tracks)
+        # L'index en dernier : sa présence signale des fichiers complets
+        for name in (TRACK_FILE, TRACK_OFFSETS_FILE, TRACK_INDEX):
+            os.replace(os.path.join(tmp_dir, name), os.path.join(path, name))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def read_tracks(workbook_hash):
+    """
+    Mappe en mémoire les positions vidéo d'un classeur, sans les charger : seules les pages
+    lues (une session, une carte de chaleur) sont chargées par le système.
+    Retourne (x, y, offsets, errors, store_seconds) ; x et y sont des vues np.memmap en lecture seule.
+    """
+    start = time.perf_counter()
+    path = _store_path(workbook_hash)
+    with open(os.path.join(path, TRACK_INDEX), encoding="utf-8") as f:
+        index = json.load(f)
+    coordinates = np.load(os.path.join(path, TRACK_FILE), mmap_mode="r")
+    offsets = np.load(os.path.join(path, TRACK_OFFSETS_FILE))
+    errors = {int(row): message for row, message in index["errors"].items()}
+    return coordinates[0], coordinates[1], offsets, errors, time.perf_counter() - start
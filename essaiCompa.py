@@ -5,9 +5,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from PFtest import plot_feminine_graph, get_feminine_constants
 from PMtest import plot_masculine_graph, get_masculine_constants
-import os
-import tempfile
-import zipfile
+from ingestion import load_archive, format_load_timings
+from figure_cache import plot_cached, format_figure_cache_stats
 import base64
 
 # -----------------------------
@@ -59,41 +58,27 @@ def load_zip(key_prefix):
     Charge un fichier ZIP contenant :
       - Un fichier Excel (avec les feuilles 'CSV', 'Poste', 'Constante')
       - Un dossier "Trombi" avec les images des joueurs.
-    Le fichier ZIP est extrait dans un répertoire temporaire et renvoie :
-      data, positions, constante_data, base_folder
+    Le fichier ZIP n'est pas extrait sur disque ; renvoie :
+      data, positions, constante_data, dataset (ZipDataset pour lire les photos)
+    Le résultat est partagé avec INVENT.load_folder via le cache de ingestion.load_archive.
     """
     uploaded_zip = st.file_uploader(f"Charger un fichier ZIP ({key_prefix})", type=["zip"], key=f"{key_prefix}_zip")
     if uploaded_zip is not None:
         try:
-            base_folder = tempfile.mkdtemp()
-            zip_path = os.path.join(base_folder, "uploaded.zip")
-            with open(zip_path, "wb") as f:
-                f.write(uploaded_zip.getvalue())
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(base_folder)
-            # Rechercher le fichier Excel dans le ZIP
-            excel_file_path = None
-            for root, dirs, files in os.walk(base_folder):
-                for file in files:
-                    if file.lower().endswith((".xls", ".xlsx", ".xlsm")):
-                        excel_file_path = os.path.join(root, file)
-                        break
-                if excel_file_path:
-                    break
-            if not excel_file_path:
+            dataset = load_archive(uploaded_zip.getvalue())
+            # Vignettes du Trombi générées en arrière-plan, sans retarder l'affichage
+            dataset.warm_portraits()
+            if not dataset.excel_member:
                 st.error("Aucun fichier Excel trouvé dans le ZIP.")
                 return None, None, None, None
-            excel_data = pd.ExcelFile(excel_file_path)
             required_sheets = {"CSV", "Poste", "Constante"}
-            missing = required_sheets - set(excel_data.sheet_names)
+            missing = dataset.missing_sheets(required_sheets)
             if missing:
                 st.error("Feuilles manquantes : " + ", ".join(missing))
                 return None, None, None, None
-            data = excel_data.parse("CSV")
-            positions = excel_data.parse("Poste")
-            constante_data = excel_data.parse("Constante")
             st.success("Fichier ZIP chargé avec succès.")
-            return data, positions, constante_data, base_folder
+            st.caption(format_load_timings(dataset.timings))
+            return dataset.data, dataset.positions, dataset.constante_data, dataset
         except Exception as e:
             st.error(f"Erreur lors du chargement du ZIP ({key_prefix}) : {e}")
             return None, None, None, None
@@ -104,31 +89,28 @@ def load_zip(key_prefix):
 # -----------------------------
 # Fonction pour afficher le portrait d'un joueur
 # -----------------------------
-def display_player_photo(selected_player, positions, base_folder):
+def display_player_photo(selected_player, positions, dataset):
     """
-    Récupère et affiche le portrait du joueur à partir du dossier "Trombi".
+    Récupère et affiche le portrait du joueur à partir du dossier "Trombi" de l'archive.
     L'image est affichée au format PNG avec transparence.
     """
     if "Trombi" not in positions.columns:
         st.error("La colonne 'Trombi' n'existe pas dans la feuille Poste.")
         return
-    selected_norm = str(selected_player).strip().lower()
-    positions["Joueur_norm"] = positions["Joueur"].astype(str).str.strip().str.lower()
-    player_row = positions[positions["Joueur_norm"] == selected_norm]
-    if player_row.empty:
+    player_row = dataset.index.poste_row_normalized(selected_player)
+    if player_row is None:
         st.warning("Aucune donnée de portrait pour ce joueur.")
         return
-    file_name = player_row.iloc[0]["Trombi"]
+    file_name = player_row.get("Trombi")
     if not file_name:
         st.warning("Aucune photo disponible pour ce joueur.")
         return
-    image_path = os.path.join(base_folder, "Trombi", file_name)
-    if not os.path.exists(image_path):
-        st.error(f"Le fichier image n'existe pas : {image_path}")
+    if not dataset.has_trombi(file_name):
+        st.error(f"Le fichier image n'existe pas dans l'archive : Trombi/{file_name}")
         return
     try:
-        with open(image_path, "rb") as img_file:
-            image_bytes = img_file.read()
+        # Vignette d'affichage préparée au premier affichage puis gardée en cache (voir thumbnails)
+        image_bytes = dataset.portrait(file_name).display_png
     except Exception as e:
         st.error(f"Erreur lors de la lecture du fichier image : {e}")
         return
@@ -140,42 +122,15 @@ def display_player_photo(selected_player, positions, base_folder):
     '''
     st.markdown(html, unsafe_allow_html=True)
 
-# -----------------------------
-# Fonction de filtrage et de calcul additionnel (inchangé)
-# -----------------------------
-def filter_duration(player_data, min_duration=3900):
-    return player_data[player_data["Durée"] >= min_duration]
-
-def compute_additional_columns(player_data):
-    if "Dist>16kmh" in player_data.columns:
-        player_data["Distance > 16km/h"] = player_data["Dist>16kmh"]
-    if "Dist>20kmh" in player_data.columns:
-        player_data["Distance > 20km/h"] = (player_data["Dist>20kmh"] * 1000)
-    if "Dist>20kmh" in player_data.columns and "Durée" in player_data.columns:
-        player_data["Distance>20kmh/min"] = (player_data["Dist>20kmh"] * 1000).fillna(0) / (player_data["Durée"].replace(0, 1) / 60)
-    if "Distance16" in player_data.columns and "Durée" in player_data.columns:
-        player_data["Distance>16kmh/min"] = player_data["Distance16"] / (player_data["Durée"].replace(0, 1) / 60)
-    if all(col in player_data.columns for col in ["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²",
-                                                   "Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²"]):
-        player_data["Nb Acc/Dec > 2m/s²"] = player_data[["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²",
-                                                         "Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²"]].sum(axis=1)
-    if "Nb Acc/Dec > 2m/s²" in player_data.columns and "Durée" in player_data.columns:
-        player_data["Nb Acc/Dec > 2m/s²/min"] = player_data["Nb Acc/Dec > 2m/s²"].fillna(0) / (player_data["Durée"].replace(0, 1) / 60)
-    if all(col in player_data.columns for col in ["Nb Acc>4m/s²", "Nb Dec>4m/s²"]):
-        player_data["Nb Acc/Dec > 4m/s²"] = player_data[["Nb Acc>4m/s²", "Nb Dec>4m/s²"]].sum(axis=1)
-    if "Nb Acc/Dec > 4m/s²" in player_data.columns and "Durée" in player_data.columns:
-        player_data["Nb Acc/Dec > 4m/s²/min"] = player_data["Nb Acc/Dec > 4m/s²"].fillna(0) / (player_data["Durée"].replace(0, 1) / 60)
-    return player_data
-
 # -----------------------------
 # Fonction d'affichage pour la comparaison en colonnes
 # -----------------------------
 def display_column_comparison(key_prefix, shared_graphs):
     # Charge le fichier ZIP pour la colonne
-    data, positions, constante_data, base_folder = load_zip(key_prefix)
+    data, positions, constante_data, dataset = load_zip(key_prefix)
     if data is not None:
         st.write(f"Sélectionner un joueur ({key_prefix}):")
-        players = data["Joueur"].drop_duplicates().tolist()
+        players = dataset.index.players
         selected_player = st.selectbox(
             f"Sélectionner un joueur/joueuse ({key_prefix})",
             players,
@@ -189,16 +144,16 @@ def display_column_comparison(key_prefix, shared_graphs):
         if selected_player:
             st.markdown(f"**{selected_player}**")
             # Afficher le portrait du joueur sous le selectbox
-            display_player_photo(selected_player, positions, base_folder)
+            display_player_photo(selected_player, positions, dataset)
             st.write(f"Graphiques pour {selected_player} ({global_module}):")
             filter_matches = st.checkbox(
                 f"Afficher les matchs < 3900 secondes ({key_prefix})",
                 value=False,
                 key=f"{key_prefix}_filter"
             )
-            player_data = data[data["Joueur"] == selected_player]
-            if not filter_matches:
-                player_data = filter_duration(player_data)
+            min_duration = None if filter_matches else 3900
+            player_data = dataset.index.rows(selected_player, min_duration=min_duration)
+            cache_key = (dataset.digest, min_duration)
             if player_data.empty:
                 st.warning(f"Aucune donnée après filtrage ({key_prefix}).")
             else:
@@ -207,9 +162,11 @@ def display_column_comparison(key_prefix, shared_graphs):
                     for graph in shared_graphs:
                         st.subheader(f"Graphique : {graph}")
                         if global_module == "Pôle Féminin":
-                            fig = plot_feminine_graph(graph, selected_player, constants, player_data, positions)
+                            fig = plot_cached(plot_feminine_graph, graph, selected_player, constants, player_data, positions,
+                                              index=dataset.index, key=cache_key)
                         else:
-                            fig = plot_masculine_graph(graph, selected_player, constants, player_data, positions)
+                            fig = plot_cached(plot_masculine_graph, graph, selected_player, constants, player_data, positions,
+                                              index=dataset.index, key=cache_key)
                         if fig:
                             st.plotly_chart(fig, key=f"{key_prefix}_{selected_player}_{graph}")
                         else:
@@ -273,3 +230,4 @@ with col1:
 with col2:
     st.header("Joueur 2")
     display_column_comparison("col2", shared_graphs)
+st.sidebar.caption(format_figure_cache_stats())
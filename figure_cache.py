@@ -0,0 +1,43 @@
+import os
+
+import plotly.graph_objects as go
+
+from cache import LRUCache
+
+# Nombre maximal de figures Plotly gardées en mémoire (chaque figure compte pour 1)
+FIGURE_CACHE_MAX_ENTRIES = int(os.environ.get("FIGURE_CACHE_MAX_ENTRIES", 256))
+
+_figure_cache = LRUCache(FIGURE_CACHE_MAX_ENTRIES)
+
+
+def plot_cached(plot_function, selected_graph, player_name, constants, data, positions, index=None, key=None):
+    """
+    Appelle plot_function (plot_feminine_graph / plot_masculine_graph) en mémorisant la figure.
+    key identifie le jeu de données et le filtrage, ex. (empreinte du ZIP, durée minimale) ;
+    la clé complète est (key, module, graphique, joueur). Sans key, aucun cache n'est utilisé.
+    Une copie est renvoyée pour que l'appelant puisse modifier la figure (update_layout, ...).
+    Les graphiques indisponibles (None) ne sont pas mis en cache afin que leurs
+    avertissements restent affichés.
+    """
+    if key is None:
+        return plot_function(selected_graph, player_name, constants, data, positions, index=index)
+    full_key = (key, plot_function.__name__, selected_graph, player_name)
+    fig = _figure_cache.get(full_key)
+    if fig is None:
+        fig = plot_function(selected_graph, player_name, constants, data, positions, index=index)
+        if fig is None:
+            return None
+        _figure_cache.put(full_key, fig, 1)
+    return go.Figure(fig)
+
+
+def figure_cache_stats():
+    return _figure_cache.stats()
+
+
+def format_figure_cache_stats():
+    stats = figure_cache_stats()
+    return (
+        f"Cache des figures : {stats['hits']} réutilisées, {stats['misses']} calculées "
+        f"({stats['entries']}/{stats['max_size']} en mémoire)"
+    )
@@ -0,0 +1,487 @@
+"""
+Séries de fréquence cardiaque de l'analyse FC (ANALYSE.py) : lecture des exports CSV (en cache
+par contenu), statistiques de plages, récupération et détection des épisodes d'effort.
+"""
+import io
+import os
+import time
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+from scipy.signal import find_peaks
+
+from cache import LRUCache, content_hash
+
+# Décalages (minutes après la FC max) du tableau de récupération par défaut
+RECOVERY_OFFSETS_MINUTES = (1, 2, 3, 5)
+# Courbe de récupération : un point par seconde jusqu'à RECOVERY_CURVE_MINUTES après la FC max
+RECOVERY_CURVE_STEP_MINUTES = 1 / 60
+RECOVERY_CURVE_MINUTES = 5
+# Taille des blocs des tables de min / max : mémoire en n / bloc x log(n), bords parcourus en O(bloc)
+RANGE_BLOCK_SIZE = 64
+# Détection des épisodes : lissage (s), hauteur minimale du pic au-dessus des creux voisins (bpm),
+# écart minimal entre deux pics (minutes) et étendue de la recherche des creux (minutes)
+EPISODE_SMOOTHING_SECONDS = 5
+EPISODE_MIN_PROMINENCE = 15
+EPISODE_MIN_DISTANCE_MINUTES = 2
+EPISODE_SEARCH_MINUTES = 20
+# Nombre maximal de points envoyés au navigateur pour le tracé de la FC
+HR_PLOT_MAX_POINTS = int(os.environ.get("RAPPORT_HR_PLOT_MAX_POINTS", 4000))
+
+TIME_COLUMN = "Time"
+HR_COLUMN = "HR (bpm)"
+# L'en-tête des exports est sur la 3e ligne
+CSV_SKIP_ROWS = 2
+# Au-delà de cette taille (octets), le fichier est lu par blocs de CSV_CHUNK_ROWS lignes
+CSV_CHUNK_THRESHOLD_BYTES = int(os.environ.get("RAPPORT_HR_CHUNK_THRESHOLD_BYTES", 64 * 1024 ** 2))
+CSV_CHUNK_ROWS = int(os.environ.get("RAPPORT_HR_CHUNK_ROWS", 500_000))
+# Formats d'heure essayés (après la détection de pandas, qui ne reconnaît pas les heures seules)
+TIME_FORMATS = ("%H:%M:%S", "%H:%M:%S.%f", "%M:%S", "%M:%S.%f")
+TIME_FORMAT_SAMPLE = 200
+# Part minimale de l'échantillon que le format doit lire
+TIME_FORMAT_MIN_MATCH = 0.9
+# Taille maximale (octets) des fichiers FC lus gardés en mémoire
+HR_CACHE_MAX_BYTES = int(os.environ.get("RAPPORT_HR_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+_hr_cache = LRUCache(HR_CACHE_MAX_BYTES)
+
+
+@dataclass
+class HeartRateSeries:
+    """FC (bpm) et temps écoulé (minutes) triés par temps, sans valeurs manquantes."""
+    minutes: np.ndarray
+    hr: np.ndarray
+
+    @classmethod
+    def from_frame(cls, df, time_column="Elapsed Minutes", hr_column="HR (bpm)"):
+        minutes = df[time_column].to_numpy(dtype=np.float64)
+        hr = df[hr_column].to_numpy(dtype=np.float64)
+        valid = ~(np.isnan(minutes) | np.isnan(hr))
+        minutes, hr = minutes[valid], hr[valid]
+        if len(minutes) > 1 and np.any(minutes[1:] < minutes[:-1]):
+            order = np.argsort(minutes, kind="stable")
+            minutes, hr = minutes[order], hr[order]
+        return cls(minutes=minutes, hr=hr)
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def range_slice(self, start, end):
+        """Positions [i0, i1) des échantillons de la plage [start, end] (minutes)."""
+        return (int(np.searchsorted(self.minutes, start, side="left")),
+                int(np.searchsorted(self.minutes, end, side="right")))
+
+    def hr_at(self, minutes):
+        """FC interpolée linéairement aux instants minutes ; NaN en dehors de l'enregistrement."""
+        minutes = np.asarray(minutes, dtype=np.float64)
+        if len(self) == 0:
+            return np.full(minutes.shape, np.nan)
+        return np.interp(minutes, self.minutes, self.hr, left=np.nan, right=np.nan)
+
+    def plot_points(self, start=None, end=None, max_points=HR_PLOT_MAX_POINTS):
+        """Points (minutes, FC) de la plage [start, end] à tracer, sous-échantillonnés à max_points au plus."""
+        if len(self) == 0:
+            return self.minutes, self.hr
+        i0, i1 = self.range_slice(self.minutes[0] if start is None else start,
+                                  self.minutes[-1] if end is None else end)
+        return downsample_minmax(self.minutes[i0:i1], self.hr[i0:i1], max_points)
+
+
+def _sparse_table(values, better):
+    """
+    Table creuse d'indices : levels[k][i] est l'indice du meilleur élément de values[i:i + 2**k]
+    (le premier en cas d'égalité), better(a, b) indiquant si a est au moins aussi bon que b.
+    """
+    levels = [np.arange(len(values), dtype=np.int32)]
+    span = 1
+    while 2 * span <= len(values):
+        previous = levels[-1]
+        left, right = previous[:len(previous) - span], previous[span:]
+        levels.append(np.where(better(values[left], values[right]), left, right))
+        span *= 2
+    return levels
+
+
+class _ArgmaxTable:
+    """Indice du premier maximum de values sur une plage [i0, i1), en temps constant (vectorisé)."""
+
+    def __init__(self, values, block=RANGE_BLOCK_SIZE):
+        self.values = values
+        self.block = block
+        count = -(-len(values) // block)
+        padded = np.full(count * block, -np.inf)
+        padded[:len(values)] = values
+        # Premier maximum de chaque bloc, puis table creuse sur les blocs
+        self.block_best = np.argmax(padded.reshape(count, block), axis=1) + np.arange(count) * block
+        self.levels = _sparse_table(values[self.block_best], np.greater_equal)
+
+    def nbytes(self):
+        return self.block_best.nbytes + sum(level.nbytes for level in self.levels)
+
+    def _scan(self, lo, hi):
+        """Premier maximum de [lo, hi) (au plus un bloc), -1 si la plage est vide."""
+        index = lo[:, None] + np.arange(self.block)
+        inside = index < hi[:, None]
+        candidates = np.where(inside, self.values[np.minimum(index, len(self.values) - 1)], -np.inf)
+        best = lo + np.argmax(candidates, axis=1)
+        return np.where(hi > lo, best, -1)
+
+    def _blocks(self, b0, b1):
+        """Premier maximum des blocs complets [b0, b1) (b1 > b0) : deux fenêtres de 2**k qui se recouvrent."""
+        k = np.floor(np.log2(b1 - b0)).astype(np.int64)
+        result = np.empty(len(b0), dtype=np.int64)
+        block_values = self.values[self.block_best]
+        for level in np.unique(k):
+            rows = k == level
+            left = self.levels[level][b0[rows]]
+            right = self.levels[level][b1[rows] - (1 << int(level))]
+            # La fenêtre de gauche gagne en cas d'égalité : premier maximum
+            result[rows] = self.block_best[np.where(block_values[left] >= block_values[right], left, right)]
+        return result
+
+    def query(self, i0, i1):
+        """Indices des premiers maxima des plages non vides [i0, i1)."""
+        b0 = -(-i0 // self.block)
+        b1 = i1 // self.block
+        best = self._scan(i0, np.minimum(b0 * self.block, i1))
+        full = b1 > b0
+        middle = np.full(len(i0), -1)
+        if full.any():
+            middle[full] = self._blocks(b0[full], b1[full])
+        right = self._scan(np.maximum(b1 * self.block, i0), i1)
+        # Candidats dans l'ordre du temps : un candidat plus tardif ne gagne que s'il est strictement meilleur
+        for candidate in (middle, right):
+            take = (candidate >= 0) & ((best < 0) | (self.values[np.maximum(candidate, 0)] > self.values[best]))
+            best = np.where(take, candidate, best)
+        return best
+
+
+class RangeStats:
+    """
+    Statistiques de FC sur n'importe quelle plage de la série, en O(1) par plage après la
+    recherche des positions (O(log n)) : sommes cumulées pour la moyenne, tables creuses par
+    blocs pour le min et le max (voir _ArgmaxTable). Construite une fois par fichier.
+    """
+
+    def __init__(self, series):
+        self.series = series
+        self._prefix = np.concatenate([[0.0], np.cumsum(series.hr)])
+        self._max = _ArgmaxTable(series.hr)
+        self._min = _ArgmaxTable(-series.hr)
+
+    def nbytes(self):
+        return self._prefix.nbytes + self._max.nbytes() + self._min.nbytes() + self._min.values.nbytes
+
+    def windows(self, starts, ends):
+        """
+        Statistiques des plages [starts[j], ends[j]] (minutes), calculées ensemble.
+        Retourne un DataFrame : Début, Fin, Échantillons, HR max, Temps HR max, HR moyenne, HR min ;
+        valeurs manquantes pour les plages sans échantillon.
+        """
+        starts = np.atleast_1d(np.asarray(starts, dtype=np.float64))
+        ends = np.atleast_1d(np.asarray(ends, dtype=np.float64))
+        i0 = np.searchsorted(self.series.minutes, starts, side="left")
+        i1 = np.searchsorted(self.series.minutes, ends, side="right")
+        count = np.maximum(i1 - i0, 0)
+        valid = count > 0
+        hr_max = np.full(len(starts), np.nan)
+        max_time = np.full(len(starts), np.nan)
+        hr_min = np.full(len(starts), np.nan)
+        if valid.any():
+            top = self._max.query(i0[valid], i1[valid])
+            bottom = self._min.query(i0[valid], i1[valid])
+            hr_max[valid] = self.series.hr[top]
+            max_time[valid] = self.series.minutes[top]
+            hr_min[valid] = self.series.hr[bottom]
+        hr_mean = np.full(len(starts), np.nan)
+        hr_mean[valid] = (self._prefix[i1[valid]] - self._prefix[i0[valid]]) / count[valid]
+        return pd.DataFrame({
+            "Début": starts, "Fin": ends, "Échantillons": count, "HR max": hr_max,
+            "Temps HR max": max_time, "HR moyenne": hr_mean, "HR min": hr_min,
+        })
+
+    def window(self, start, end):
+        """Statistiques de la plage [start, end] (dict, voir windows), ou None si elle est vide."""
+        row = self.windows([start], [end]).iloc[0]
+        return row.to_dict() if row["Échantillons"] > 0 else None
+
+
+def split_windows(start, end, block_minutes=None, parts=None):
+    """
+    Découpe [start, end] en parts blocs égaux, ou en blocs de block_minutes (le dernier
+    éventuellement plus court). Retourne (débuts, fins).
+    """
+    if parts:
+        edges = np.linspace(start, end, int(parts) + 1)
+    else:
+        edges = np.append(np.arange(start, end, block_minutes), end)
+    return edges[:-1], edges[1:]
+
+
+def downsample_minmax(x, y, max_points=HR_PLOT_MAX_POINTS):
+    """
+    Réduit (x, y) à max_points points au plus en gardant, pour chaque paquet de points
+    consécutifs, le minimum et le maximum de y dans leur ordre d'origine. Vectorisé (un
+    reshape par paquets) ; y ne doit pas contenir de NaN.
+    """
+    n = len(x)
+    if n <= max_points or max_points < 2:
+        return x, y
+    size = -(-n // (max_points // 2))
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    # Le dernier paquet peut être incomplet : les cases de remplissage (NaN) sont ignorées
+    lowest = np.nanargmin(padded, axis=1)
+    highest = np.nanargmax(padded, axis=1)
+    base = np.arange(buckets) * size
+    index = np.stack([base + np.minimum(lowest, highest), base + np.maximum(lowest, highest)], axis=1).ravel()
+    # Paquet plat : min et max au même point, gardé une seule fois
+    index = index[np.concatenate([[True], index[1:] != index[:-1]])]
+    return x[index], y[index]
+
+
+def recovery(series, peak_time, peak_hr, offsets=RECOVERY_OFFSETS_MINUTES):
+    """
+    Récupération après la FC max : pour chaque décalage (minutes), FC interpolée à
+    peak_time + décalage et différence avec peak_hr. Retourne (fc, différences) ; NaN pour
+    les décalages au-delà de la fin de l'enregistrement.
+    """
+    hr = series.hr_at(peak_time + np.asarray(offsets, dtype=np.float64))
+    return hr, peak_hr - hr
+
+
+def recovery_curve_offsets(horizon_minutes=RECOVERY_CURVE_MINUTES, step_minutes=RECOVERY_CURVE_STEP_MINUTES):
+    """Décalages réguliers de step_minutes jusqu'à horizon_minutes inclus."""
+    count = int(round(horizon_minutes / step_minutes))
+    return np.arange(1, count + 1) * step_minutes
+
+
+def parse_offsets(text):
+    """
+    Décalages saisis par l'utilisateur ("1, 2, 3, 5" ou "0.5; 1.5"), en minutes, séparés par
+    des virgules, points-virgules ou espaces, triés et dédoublonnés. Lève ValueError si une
+    valeur n'est pas un nombre positif.
+    """
+    values = []
+    for token in text.replace(";", " ").replace(",", " ").split():
+        try:
+            value = float(token)
+        except ValueError:
+            raise ValueError(f"Décalage invalide : {token}") from None
+        if value <= 0:
+            raise ValueError(f"Décalage invalide : {token} (doit être positif)")
+        values.append(value)
+    return sorted(set(values))
+
+
+def format_offset(minutes):
+    """Libellé d'un décalage : "2 min", "1 min 30 s" ou "45 s"."""
+    seconds = int(round(minutes * 60))
+    whole, rest = divmod(seconds, 60)
+    if whole and rest:
+        return f"{whole} min {rest} s"
+    return f"{whole} min" if whole else f"{rest} s"
+
+
+def _sample_minutes(series):
+    """Pas d'échantillonnage médian (minutes) de la série."""
+    steps = np.diff(series.minutes)
+    steps = steps[steps > 0]
+    return float(np.median(steps)) if len(steps) else 0.0
+
+
+def _centered_mean(values, half_window):
+    """Moyenne glissante centrée de 2 * half_window + 1 points, tronquée aux extrémités."""
+    if half_window <= 0:
+        return values
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    index = np.arange(len(values))
+    lo = np.maximum(index - half_window, 0)
+    hi = np.minimum(index + half_window + 1, len(values))
+    return (cumulative[hi] - cumulative[lo]) / (hi - lo)
+
+
+def detect_episodes(stats, offsets=RECOVERY_OFFSETS_MINUTES, min_prominence=EPISODE_MIN_PROMINENCE,
+                    min_distance_minutes=EPISODE_MIN_DISTANCE_MINUTES, smoothing_seconds=EPISODE_SMOOTHING_SECONDS,
+                    search_minutes=EPISODE_SEARCH_MINUTES):
+    """
+    Épisodes effort / récupération de tout l'enregistrement (stats : RangeStats du fichier).
+    Les pics sont cherchés sur la FC lissée sur smoothing_seconds (un point aberrant ne fait
+    pas un épisode). Un épisode va du creux qui précède son pic au creux qui précède le pic
+    suivant : la FC max et son instant sont relus sur les échantillons bruts de cet intervalle.
+    La récupération à chaque décalage est interpolée comme dans recovery ; elle est laissée
+    vide au-delà du début de l'effort suivant.
+    Retourne un DataFrame trié par temps : Épisode, Début, Temps HR max, HR max, FC début,
+    Montée, Proéminence, puis une colonne de différence par décalage.
+    """
+    series = stats.series
+    offsets = np.asarray(offsets, dtype=np.float64)
+    recovery_columns = [f"Récup. {format_offset(offset)}" for offset in offsets]
+    columns = ["Épisode", "Début", "Temps HR max", "HR max", "FC début", "Montée", "Proéminence"] + recovery_columns
+    step = _sample_minutes(series)
+    if len(series) < 3 or step <= 0:
+        return pd.DataFrame(columns=columns)
+    half_window = int(round(smoothing_seconds / 60 / step / 2))
+    smoothed = _centered_mean(series.hr, half_window)
+    peaks, properties = find_peaks(
+        smoothed, prominence=min_prominence, distance=max(1, int(round(min_distance_minutes / step))),
+        wlen=max(3, int(round(search_minutes / step)) | 1),
+    )
+    if len(peaks) == 0:
+        return pd.DataFrame(columns=columns)
+    # Creux entre deux pics consécutifs : fin d'un épisode et début du suivant
+    troughs = np.array([lo + np.argmin(smoothed[lo:hi]) for lo, hi in zip(peaks[:-1], peaks[1:])], dtype=np.int64)
+    first = properties["left_bases"]
+    # La base gauche d'un pic peut précéder un pic voisin plus bas : le creux le plus proche l'emporte
+    first[1:] = np.maximum(first[1:], troughs)
+    last = np.append(troughs, properties["right_bases"][-1])
+    # FC max brute de chaque épisode (la moyenne glissante écrête et décale le sommet)
+    starts = series.minutes[first]
+    raw = stats.windows(starts, series.minutes[last])
+    hr_max = raw["HR max"].to_numpy()
+    max_time = raw["Temps HR max"].to_numpy()
+    start_hr = series.hr[first]
+
+    differences = hr_max[:, None] - series.hr_at(max_time[:, None] + offsets)
+    # Récupération interrompue par l'effort suivant : non représentative
+    next_start = np.append(starts[1:], np.inf)
+    differences[max_time[:, None] + offsets > next_start[:, None]] = np.nan
+    episodes = pd.DataFrame({
+        "Épisode": np.arange(1, len(peaks) + 1),
+        "Début": starts,
+        "Temps HR max": max_time,
+        "HR max": hr_max,
+        "FC début": start_hr,
+        "Montée": hr_max - start_hr,
+        "Proéminence": properties["prominences"],
+    })
+    for column, values in zip(recovery_columns, differences.T):
+        episodes[column] = values
+    return episodes
+
+
+@dataclass
+class HeartRateFile:
+    """Export FC lu : colonnes utiles (avec Elapsed Minutes), série triée et statistiques de lecture."""
+    data: pd.DataFrame
+    series: HeartRateSeries
+    stats: RangeStats
+    time_format: str
+    chunks: int
+    seconds: float
+
+    def nbytes(self):
+        size = int(self.data.memory_usage(deep=True).sum())
+        if self.series is not None:
+            size += self.series.minutes.nbytes + self.series.hr.nbytes + self.stats.nbytes()
+        return size
+
+
+def detect_time_format(values):
+    """
+    Format strptime de la colonne Time, détecté sur un échantillon de valeurs non vides,
+    ou None si aucun format ne convient (analyse valeur par valeur en dernier recours).
+    """
+    sample = pd.Series(values).dropna().astype(str).head(TIME_FORMAT_SAMPLE)
+    if sample.empty:
+        return None
+    candidates = [guess_datetime_format(sample.iloc[0])] + list(TIME_FORMATS)
+    for time_format in candidates:
+        if time_format is None:
+            continue
+        # Quelques valeurs illisibles (lignes de pause, texte) ne remettent pas en cause le format
+        if pd.to_datetime(sample, format=time_format, errors="coerce").notna().mean() >= TIME_FORMAT_MIN_MATCH:
+            return time_format
+    return None
+
+
+def parse_times(values, time_format):
+    """Convertit la colonne Time avec le format détecté ; valeurs illisibles -> NaT."""
+    with warnings.catch_warnings():
+        # Inférence valeur par valeur (comportement d'origine) : avertissement attendu
+        warnings.simplefilter("ignore", UserWarning)
+        if time_format is not None:
+            times = pd.to_datetime(values, format=time_format, errors="coerce")
+            failed = times.isna() & values.notna()
+            # Valeurs illisibles dans tous les formats : gardées en NaT. Sinon le fichier mélange
+            # plusieurs formats (ex. fractions de seconde sur une partie des lignes) : inférence complète
+            if not failed.any() or pd.to_datetime(values[failed], errors="coerce").isna().all():
+                return times
+        return pd.to_datetime(values, errors="coerce")
+
+
+def _read_csv(content, columns, dtypes, chunksize=None):
+    return pd.read_csv(
+        io.BytesIO(content), skiprows=CSV_SKIP_ROWS, header=0, encoding="utf-8",
+        usecols=columns, dtype=dtypes, chunksize=chunksize
+    )
+
+
+def _parse_hr(data):
+    """Convertit HR (bpm) en nombres ; valeurs de remplissage ("--", texte) -> NaN."""
+    if HR_COLUMN in data.columns:
+        data[HR_COLUMN] = pd.to_numeric(data[HR_COLUMN], errors="coerce")
+
+
+def _parse_file(content, columns):
+    start = time.perf_counter()
+    header = pd.read_csv(io.BytesIO(content), skiprows=CSV_SKIP_ROWS, header=0, encoding="utf-8", nrows=0)
+    # Colonnes demandées présentes dans le fichier, dans l'ordre du fichier
+    wanted = [col for col in header.columns if col in columns]
+    # Time et HR (bpm) lus comme texte (une cellule "--" ne fait pas échouer la lecture) ;
+    # les autres colonnes gardent le type déduit par pandas
+    dtypes = {col: str for col in (TIME_COLUMN, HR_COLUMN) if col in wanted}
+    chunks = 1
+    time_format = None
+    if len(content) > CSV_CHUNK_THRESHOLD_BYTES:
+        # Lecture par blocs : les heures sont converties bloc par bloc, seules les colonnes utiles sont gardées
+        parts = []
+        for chunks, part in enumerate(_read_csv(content, wanted, dtypes, chunksize=CSV_CHUNK_ROWS), start=1):
+            if TIME_COLUMN in part.columns:
+                if chunks == 1:
+                    time_format = detect_time_format(part[TIME_COLUMN])
+                part[TIME_COLUMN] = parse_times(part[TIME_COLUMN], time_format)
+            _parse_hr(part)
+            parts.append(part)
+        data = pd.concat(parts, ignore_index=True) if parts else header[wanted]
+    else:
+        data = _read_csv(content, wanted, dtypes)
+        if TIME_COLUMN in data.columns:
+            time_format = detect_time_format(data[TIME_COLUMN])
+            data[TIME_COLUMN] = parse_times(data[TIME_COLUMN], time_format)
+        _parse_hr(data)
+    series = stats = None
+    if TIME_COLUMN in data.columns and HR_COLUMN in data.columns:
+        data["Elapsed Minutes"] = (data[TIME_COLUMN] - data[TIME_COLUMN].min()).dt.total_seconds() / 60
+        series = HeartRateSeries.from_frame(data)
+        stats = RangeStats(series)
+    return HeartRateFile(
+        data=data, series=series, stats=stats, time_format=time_format, chunks=chunks, seconds=time.perf_counter() - start
+    )
+
+
+def load_heart_rate_file(content, extra_columns=()):
+    """
+    Lit un export FC (octets du CSV) : colonnes Time, HR (bpm) et extra_columns seulement.
+    Le résultat est mis en cache par (empreinte du contenu, colonnes) et partagé par toutes
+    les sessions : les relances (changement de plage, de décalages) ne relisent pas le fichier.
+    Les colonnes absentes du fichier sont ignorées ; series vaut None sans Time ou HR (bpm).
+    """
+    columns = (TIME_COLUMN, HR_COLUMN) + tuple(col for col in extra_columns if col not in (TIME_COLUMN, HR_COLUMN))
+    return _hr_cache.get_or_create(
+        (content_hash(content), columns), lambda: _parse_file(content, columns), sizeof=HeartRateFile.nbytes
+    )
+
+
+def format_load_stats(recording):
+    mode = f"{recording.chunks} blocs" if recording.chunks > 1 else "lecture directe"
+    time_format = recording.time_format or "détection valeur par valeur"
+    return (
+        f"{len(recording.data)} lignes, {len(recording.data.columns)} colonnes lues en {recording.seconds:.2f} s "
+        f"({mode}, format de l'heure : {time_format})"
+    )
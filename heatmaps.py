@@ -0,0 +1,356 @@
+"""
+Cartes de chaleur des positions vidéo (terrain de 105 x 68 m).
+
+Les points sont regroupés en une passe vectorisée (np.bincount) sur une grille dont la
+taille des cellules est configurable, puis lissés par un filtre gaussien dont le sigma est
+exprimé en mètres : une grille plus grossière utilise un sigma proportionnellement plus petit
+(en cellules) et coûte beaucoup moins cher. Les histogrammes bruts et les cartes sont mis
+en cache par (archive, joueur, session, résolution). Les cartes agrégées (saison d'un joueur,
+sélection de sessions, équipe sur une session) additionnent les histogrammes des sessions
+dans un cumul gardé en cache : ajouter ou retirer une session ne coûte que cette session
+(voir aggregate_heatmap). L'affichage envoie au navigateur une image PNG colorisée côté
+serveur, ou une trace Heatmap sous-échantillonnée (voir heatmap_figure).
+
+    python heatmaps.py    # temps de calcul pour 10k, 100k et 1M points
+"""
+import base64
+import io
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import plotly.graph_objects as go
+from PIL import Image, ImageColor
+from scipy.ndimage import gaussian_filter
+
+from cache import LRUCache
+
+PITCH_LENGTH = 105
+PITCH_WIDTH = 68
+# Taille d'une cellule de la grille, en mètres (l'ancienne grille 945 x 612 correspond à 0.111 m)
+HEATMAP_CELL_SIZES = (0.125, 0.25, 0.5, 1.0)
+DEFAULT_CELL_SIZE = float(os.environ.get("RAPPORT_HEATMAP_CELL_SIZE", 0.5))
+# Rayon d'influence d'un point (sigma du lissage), en mètres
+INFLUENCE_RADIUS = 1.0
+HEATMAP_CACHE_MAX_ENTRIES = int(os.environ.get("RAPPORT_HEATMAP_CACHE_MAX_ENTRIES", 128))
+# Taille maximale (octets) des histogrammes bruts par session gardés en mémoire
+HISTOGRAM_CACHE_MAX_BYTES = int(os.environ.get("RAPPORT_HEATMAP_HISTOGRAM_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+AGGREGATE_CACHE_MAX_ENTRIES = int(os.environ.get("RAPPORT_HEATMAP_AGGREGATE_CACHE_MAX_ENTRIES", 32))
+# Mode interactif : nombre maximal de cellules envoyées au navigateur
+INTERACTIVE_MAX_CELLS = int(os.environ.get("RAPPORT_HEATMAP_INTERACTIVE_MAX_CELLS", 20_000))
+COLORSCALE = [(0, "white"), (0.5, "blue"), (1, "red")]
+HEATMAP_OPACITY = 0.8
+
+PITCH_SHAPES = [
+    dict(type="rect", x0=0, y0=0, x1=105, y1=68, line=dict(color="black", width=2)),
+    dict(type="line", x0=52.5, y0=0, x1=52.5, y1=68, line=dict(color="black", width=2, dash="dash")),
+    dict(type="circle", xref="x", yref="y",
+         x0=52.5-9.15, y0=34-9.15, x1=52.5+9.15, y1=34+9.15,
+         line=dict(color="black", width=2)),
+    dict(type="rect", x0=0, y0=13.84, x1=16.5, y1=54.16, line=dict(color="black", width=2)),
+    dict(type="rect", x0=88.5, y0=13.84, x1=105, y1=54.16, line=dict(color="black", width=2)),
+    dict(type="rect", x0=-2, y0=30.34, x1=0, y1=37.66, line=dict(color="black", width=3)),
+    dict(type="rect", x0=105, y0=30.34, x1=107, y1=37.66, line=dict(color="black", width=3)),
+    dict(type="rect", x0=0, y0=24.84, x1=5.5, y1=43.16, line=dict(color="black", width=2)),
+    dict(type="rect", x0=99.5, y0=24.84, x1=105, y1=43.16, line=dict(color="black", width=2)),
+    dict(type="circle", xref="x", yref="y", x0=11-0.4, y0=34-0.4, x1=11+0.4, y1=34+0.4,
+         line=dict(color="black", width=2)),
+    dict(type="circle", xref="x", yref="y", x0=94-0.4, y0=34-0.4, x1=94+0.4, y1=34+0.4,
+         line=dict(color="black", width=2))
+]
+
+_heatmap_cache = LRUCache(HEATMAP_CACHE_MAX_ENTRIES)
+_histogram_cache = LRUCache(HISTOGRAM_CACHE_MAX_BYTES)
+_aggregate_cache = LRUCache(AGGREGATE_CACHE_MAX_ENTRIES)
+
+
+@dataclass
+class Histogram:
+    """Nombre de points par cellule [y, x], avant lissage, pour une session."""
+    counts: np.ndarray
+    points: int
+    seconds: float
+
+    def nbytes(self):
+        return self.counts.nbytes
+
+
+@dataclass
+class Heatmap:
+    """Densité normalisée (0 à 1) indexée [y, x], avec les centres des cellules en mètres."""
+    z: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    cell_size: float
+    points: int
+    seconds: float
+    # PNG colorisé, calculé à la première demande puis gardé avec la carte (voir to_png)
+    _png: bytes = field(default=None, repr=False)
+
+    def to_png(self):
+        """Carte colorisée côté serveur (même échelle de couleurs que le mode interactif), en PNG."""
+        if self._png is None:
+            # PNG à palette : un octet par cellule (niveau 0-255), la palette porte l'échelle de couleurs
+            image = Image.fromarray(np.round(self.z[::-1] * 255).astype(np.uint8)).convert("P")
+            image.putpalette(_color_lut().tobytes())
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            self._png = buffer.getvalue()
+        return self._png
+
+    def downsampled(self, max_cells=INTERACTIVE_MAX_CELLS):
+        """Copie moyennée par blocs de f x f cellules, avec au plus max_cells cellules."""
+        ny, nx = self.z.shape
+        factor = int(np.ceil(np.sqrt(ny * nx / max_cells)))
+        if factor <= 1:
+            return self
+        pad = ((0, -ny % factor), (0, -nx % factor))
+        z = np.pad(self.z, pad, mode="edge")
+        z = z.reshape(z.shape[0] // factor, factor, z.shape[1] // factor, factor).mean(axis=(1, 3))
+        z /= max(z.max(), 1e-12)
+        step = self.cell_size * factor
+        return Heatmap(
+            z=z,
+            x=(np.arange(z.shape[1]) + 0.5) * step,
+            y=(np.arange(z.shape[0]) + 0.5) * step,
+            cell_size=step,
+            points=self.points,
+            seconds=self.seconds,
+        )
+
+
+def _color_lut():
+    """Table de 256 couleurs RGB interpolées linéairement entre les paliers de COLORSCALE."""
+    stops = np.array([position for position, _ in COLORSCALE])
+    colors = np.array([ImageColor.getrgb(color) for _, color in COLORSCALE], dtype=float)
+    levels = np.linspace(0, 1, 256)
+    lut = np.stack([np.interp(levels, stops, colors[:, channel]) for channel in range(3)], axis=1)
+    return np.round(lut).astype(np.uint8)
+
+
+def grid_shape(cell_size):
+    """Nombre de cellules (ny, nx) de la grille pour une taille de cellule en mètres."""
+    return int(round(PITCH_WIDTH / cell_size)), int(round(PITCH_LENGTH / cell_size))
+
+
+def compute_histogram(x, y, cell_size=DEFAULT_CELL_SIZE):
+    """Histogramme brut des points (x, y) en mètres ; les points hors du terrain sont ignorés."""
+    start = time.perf_counter()
+    ny, nx = grid_shape(cell_size)
+    x = np.asarray(x)
+    y = np.asarray(y)
+    # Binning vectorisé : indice de cellule de chaque point puis comptage (np.bincount)
+    inside = (x >= 0) & (x < PITCH_LENGTH) & (y >= 0) & (y < PITCH_WIDTH)
+    cells = (y[inside] * (ny / PITCH_WIDTH)).astype(np.intp) * nx + (x[inside] * (nx / PITCH_LENGTH)).astype(np.intp)
+    counts = np.bincount(cells, minlength=ny * nx).reshape(ny, nx).astype(np.int32)
+    return Histogram(counts=counts, points=len(x), seconds=time.perf_counter() - start)
+
+
+def smooth_histogram(counts, points, cell_size=DEFAULT_CELL_SIZE, influence_radius=INFLUENCE_RADIUS):
+    """Carte de chaleur normalisée d'un histogramme (d'une session ou cumulé sur plusieurs)."""
+    start = time.perf_counter()
+    ny, nx = counts.shape
+    # Filtre gaussien séparable ; sigma en cellules = rayon d'influence / taille de cellule
+    z = gaussian_filter(counts.astype(float), sigma=influence_radius / cell_size)
+    peak = z.max()
+    if peak > 0:
+        z /= peak
+    return Heatmap(
+        z=z,
+        x=(np.arange(nx) + 0.5) * (PITCH_LENGTH / nx),
+        y=(np.arange(ny) + 0.5) * (PITCH_WIDTH / ny),
+        cell_size=cell_size,
+        points=points,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def compute_heatmap(x, y, cell_size=DEFAULT_CELL_SIZE, influence_radius=INFLUENCE_RADIUS):
+    """Carte de chaleur des points (x, y) en mètres ; les points hors du terrain sont ignorés."""
+    histogram = compute_histogram(x, y, cell_size)
+    heatmap = smooth_histogram(histogram.counts, histogram.points, cell_size, influence_radius)
+    heatmap.seconds += histogram.seconds
+    return heatmap
+
+
+def session_histogram(dataset, player, session, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Histogramme brut d'un joueur pour une session, mis en cache par (archive, joueur, session,
+    résolution) : partagé par la carte de la session et par toutes les cartes agrégées.
+    Lève KeyError si la session est inconnue, ValueError si ses coordonnées sont invalides.
+    """
+    def build():
+        if dataset.tracks is None:
+            raise ValueError("La feuille Vidéo ne contient pas de colonnes X et Y.")
+        x, y = dataset.tracks.track(player, session)
+        return compute_histogram(x, y, cell_size)
+
+    return _histogram_cache.get_or_create(
+        (dataset.digest, player, session, cell_size), build, sizeof=Histogram.nbytes
+    )
+
+
+def session_heatmap(dataset, player, session, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Carte de chaleur d'un joueur pour une session de la feuille Vidéo, mise en cache par
+    (archive, joueur, session, résolution), calculée sur les positions décodées au chargement
+    (dataset.tracks). Lève ValueError si les coordonnées de la session sont invalides.
+    """
+    def build():
+        histogram = session_histogram(dataset, player, session, cell_size)
+        heatmap = smooth_histogram(histogram.counts, histogram.points, cell_size)
+        heatmap.seconds += histogram.seconds
+        return heatmap
+
+    return _heatmap_cache.get_or_create((dataset.digest, player, session, cell_size), build, sizeof=lambda _: 1)
+
+
+class _Accumulator:
+    """Somme courante des histogrammes d'un ensemble de sessions (joueur, session)."""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.counts = np.zeros(grid_shape(cell_size), dtype=np.int64)
+        self.points = 0
+        self.members = set()
+        # Sessions ignorées (coordonnées invalides ou absentes) -> message d'erreur
+        self.errors = {}
+        self.heatmap = None
+        self.lock = threading.Lock()
+
+    def _apply(self, dataset, pair, sign):
+        histogram = session_histogram(dataset, *pair, cell_size=self.cell_size)
+        self.counts += sign * histogram.counts
+        self.points += sign * histogram.points
+
+    def update(self, dataset, pairs):
+        """Ajoute les sessions manquantes et retire celles qui ne sont plus demandées."""
+        target = set(pairs)
+        removed = self.members - target
+        added = [pair for pair in dict.fromkeys(pairs) if pair not in self.members and pair not in self.errors]
+        for pair in removed:
+            self._apply(dataset, pair, -1)
+            self.members.discard(pair)
+        for pair in added:
+            try:
+                self._apply(dataset, pair, 1)
+                self.members.add(pair)
+            except KeyError:
+                self.errors[pair] = "Aucune position pour cette session."
+            except ValueError as e:
+                self.errors[pair] = str(e)
+        self.errors = {pair: message for pair, message in self.errors.items() if pair in target}
+        added = sum(pair in self.members for pair in added)
+        if added or removed:
+            self.heatmap = None
+        return added, len(removed)
+
+    def nbytes(self):
+        return self.counts.nbytes
+
+
+def aggregate_heatmap(dataset, pairs, scope, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Carte de chaleur cumulée sur les sessions pairs [(joueur, session), ...]. Le cumul est gardé
+    en cache par (archive, scope, résolution), scope identifiant la vue (ex. ("saison", joueur)) :
+    une nouvelle demande sur le même scope n'ajoute ou ne retire que les sessions qui diffèrent,
+    à partir des histogrammes par session en cache, puis lisse le total une seule fois.
+    Retourne (carte, résumé) ; le résumé donne le nombre de sessions cumulées, ajoutées,
+    retirées, les sessions ignorées et la durée du cumul.
+    """
+    if dataset.tracks is None:
+        raise ValueError("La feuille Vidéo ne contient pas de colonnes X et Y.")
+    accumulator = _aggregate_cache.get_or_create(
+        (dataset.digest, scope, cell_size), lambda: _Accumulator(cell_size), sizeof=lambda _: 1
+    )
+    with accumulator.lock:
+        start = time.perf_counter()
+        added, removed = accumulator.update(dataset, pairs)
+        accumulate_seconds = time.perf_counter() - start
+        if not accumulator.members:
+            raise ValueError("Aucune session avec des coordonnées valides pour cette sélection.")
+        if accumulator.heatmap is None:
+            accumulator.heatmap = smooth_histogram(accumulator.counts, accumulator.points, cell_size)
+        summary = {
+            "sessions": len(accumulator.members),
+            "added": added,
+            "removed": removed,
+            "errors": dict(accumulator.errors),
+            "seconds": accumulate_seconds,
+        }
+        return accumulator.heatmap, summary
+
+
+def heatmap_figure(heatmap, interactive=False, max_cells=INTERACTIVE_MAX_CELLS):
+    """
+    Figure Plotly du terrain avec la carte de chaleur. Par défaut, la carte est une image PNG
+    (layout image) placée sous les lignes du terrain : quelques dizaines de Ko au lieu d'une
+    matrice de flottants en JSON. interactive=True envoie une trace Heatmap sous-échantillonnée
+    à max_cells cellules (valeurs au survol). Retourne (figure, taille du JSON en octets, secondes).
+    """
+    start = time.perf_counter()
+    fig = go.Figure()
+    if interactive:
+        reduced = heatmap.downsampled(max_cells)
+        fig.add_trace(go.Heatmap(
+            z=reduced.z,
+            x=reduced.x,
+            y=reduced.y,
+            colorscale=COLORSCALE,
+            zmin=0,
+            opacity=HEATMAP_OPACITY,
+            showscale=False
+        ))
+    else:
+        source = "data:image/png;base64," + base64.b64encode(heatmap.to_png()).decode("ascii")
+        fig.add_layout_image(
+            source=source, xref="x", yref="y", x=0, y=PITCH_WIDTH, sizex=PITCH_LENGTH, sizey=PITCH_WIDTH,
+            sizing="stretch", opacity=HEATMAP_OPACITY, layer="below"
+        )
+    fig.update_layout(
+        shapes=PITCH_SHAPES,
+        xaxis=dict(range=[0, 105], showgrid=False, zeroline=False,
+                   showticklabels=False, visible=False, scaleanchor="y"),
+        yaxis=dict(range=[0, 68], showgrid=False, zeroline=False,
+                   showticklabels=False, visible=False, scaleanchor="x"),
+        margin=dict(l=0, r=0, t=0, b=0)
+    )
+    payload = len(fig.to_json())
+    return fig, payload, time.perf_counter() - start
+
+
+def _legacy_heatmap(x_coords, y_coords):
+    """Ancienne version (boucle Python, grille 945 x 612, indices [y, x] corrigés), pour comparaison."""
+    heatmap = np.zeros((612, 945))
+    for x, y in zip(x_coords, y_coords):
+        x_pixel = int((x / 105) * 945)
+        y_pixel = int((y / 68) * 612)
+        if 0 <= x_pixel < 945 and 0 <= y_pixel < 612:
+            heatmap[y_pixel, x_pixel] += 1
+    heatmap = gaussian_filter(heatmap, sigma=1 / (105 / 945))
+    return heatmap / max(heatmap.max(), 1e-12)
+
+
+def benchmark(sizes=(10_000, 100_000, 1_000_000), cell_sizes=HEATMAP_CELL_SIZES, legacy=True):
+    """Temps de calcul (s) par nombre de points : {points: {résolution ou "ancienne": secondes}}."""
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in sizes:
+        x = rng.uniform(0, PITCH_LENGTH, size)
+        y = rng.uniform(0, PITCH_WIDTH, size)
+        results[size] = {cell_size: compute_heatmap(x, y, cell_size).seconds for cell_size in cell_sizes}
+        if legacy:
+            start = time.perf_counter()
+            _legacy_heatmap(x, y)
+            results[size]["ancienne"] = time.perf_counter() - start
+    return results
+
+
+if __name__ == "__main__":
+    for size, timings in benchmark().items():
+        print(f"{size:>9} points : " + ", ".join(
+            f"{key} m = {seconds:.3f} s" if key != "ancienne" else f"ancienne = {seconds:.3f} s"
+            for key, seconds in timings.items()
+        ))
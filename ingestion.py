@@ -0,0 +1,266 @@
+import functools
+import io
+import os
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+import columnar_store
+from metrics import add_derived_metrics
+from player_index import PlayerIndex
+from cache import LRUCache, content_hash
+from thumbnails import PDF_PORTRAIT_WIDTH_MM, get_portrait, prepare_portraits
+from tracks import COORDINATE_COLUMNS, TrackStore, parse_tracks, track_rows
+
+# Taille maximale (en octets) occupée par les archives en cache (ZIP en mémoire + feuilles lues)
+ARCHIVE_CACHE_MAX_BYTES = int(os.environ.get("ARCHIVE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+EXCEL_EXTENSIONS = (".xls", ".xlsx", ".xlsm")
+SHEETS = ("CSV", "Vidéo", "Poste", "Constante")
+TROMBI_FOLDER = "Trombi"
+
+
+@dataclass
+class ZipDataset:
+    """
+    Jeu de données adossé à l'archive ZIP, gardée en mémoire sans extraction sur disque.
+    Les feuilles Excel sont lues une fois ; les photos du dossier "Trombi" ne sont
+    décompressées qu'à la demande, membre par membre.
+    """
+    digest: str
+    zip_bytes: bytes = field(repr=False)
+    excel_member: str = None
+    workbook_hash: str = None
+    sheet_names: list = field(default_factory=list)
+    sheets: dict = field(default_factory=dict)
+    # Nom de fichier -> chemin du membre dans l'archive, pour les photos du dossier Trombi
+    trombi_members: dict = field(default_factory=dict)
+    # Index joueur / session construit au chargement (voir player_index.PlayerIndex)
+    index: PlayerIndex = field(default=None, repr=False)
+    # Positions X / Y de la feuille Vidéo décodées au chargement (voir tracks.TrackStore)
+    tracks: TrackStore = field(default=None, repr=False)
+    # Temps de lecture : "excel" (lecture openpyxl, mesurée au premier chargement),
+    # "store" (relecture depuis le store colonnaire), "tracks" (décodage des positions vidéo) et "tracks_store" (mappage depuis le store), en secondes
+    timings: dict = field(default_factory=dict)
+    # Vignettes du Trombi en cours de génération en arrière-plan (voir warm_portraits)
+    portraits_warming: bool = field(default=False, repr=False)
+
+    @property
+    def data(self):
+        return self.sheets.get("CSV")
+
+    @property
+    def video_data(self):
+        return self.sheets.get("Vidéo")
+
+    @property
+    def positions(self):
+        return self.sheets.get("Poste")
+
+    @property
+    def constante_data(self):
+        return self.sheets.get("Constante")
+
+    def missing_sheets(self, required_sheets):
+        return set(required_sheets) - set(self.sheet_names)
+
+    def read_member(self, member):
+        """Décompresse un seul membre de l'archive et retourne ses octets."""
+        with zipfile.ZipFile(io.BytesIO(self.zip_bytes)) as zip_ref:
+            return zip_ref.read(member)
+
+    def has_trombi(self, file_name):
+        return str(file_name) in self.trombi_members
+
+    def read_trombi(self, file_name):
+        """Octets de la photo Trombi/<file_name>, ou None si elle n'est pas dans l'archive."""
+        member = self.trombi_members.get(str(file_name))
+        if member is None:
+            return None
+        return self.read_member(member)
+
+    def portrait(self, file_name, pdf_width_mm=PDF_PORTRAIT_WIDTH_MM):
+        """
+        Vignettes (thumbnails.Portrait) de la photo Trombi/<file_name>, prêtes à afficher ou à
+        insérer dans le PDF, ou None si la photo n'est pas dans l'archive. Générées au premier
+        appel : seule cette photo est alors décompressée, puis les vignettes restent en cache.
+        """
+        member = self.trombi_members.get(str(file_name))
+        if member is None:
+            return None
+        return get_portrait(self._portrait_key(member), lambda: self.read_member(member), pdf_width_mm)
+
+    def _portrait_key(self, member):
+        # L'empreinte de l'archive identifie le contenu du membre sans le lire
+        return f"{self.digest}/{member}"
+
+    def warm_portraits(self):
+        """
+        Génère en arrière-plan les vignettes de tout le Trombi, une fois par archive, pour
+        qu'elles soient prêtes avant le premier affichage ou rapport. Ne bloque pas : appelé
+        par l'interface après load_archive, le chargement lui-même ne lit aucune photo.
+        """
+        with _warmup_lock:
+            if self.portraits_warming:
+                return
+            self.portraits_warming = True
+        prepare_portraits({
+            self._portrait_key(member): functools.partial(self.read_member, member)
+            for member in self.trombi_members.values()
+        })
+
+    def nbytes(self):
+        """Taille approximative de l'entrée : ZIP en mémoire + DataFrames + positions vidéo."""
+        return (
+            len(self.zip_bytes)
+            + sum(int(df.memory_usage(deep=True).sum()) for df in self.sheets.values())
+            + (self.tracks.nbytes() if self.tracks is not None else 0)
+        )
+
+
+_archive_cache = LRUCache(ARCHIVE_CACHE_MAX_BYTES)
+_warmup_lock = threading.Lock()
+
+
+def _index_members(names):
+    """
+    Repère le premier fichier Excel de l'archive et les photos du dossier Trombi.
+    Les membres les moins profonds sont prioritaires (Trombi/ à la racine d'abord).
+    """
+    excel_member = None
+    trombi_members = {}
+    for name in sorted(names, key=lambda n: (n.count("/"), n)):
+        if name.endswith("/"):
+            continue
+        parent, _, file_name = name.rpartition("/")
+        if excel_member is None and file_name.lower().endswith(EXCEL_EXTENSIONS):
+            excel_member = name
+        if parent.rpartition("/")[2] == TROMBI_FOLDER:
+            trombi_members.setdefault(file_name, name)
+    return excel_member, trombi_members
+
+
+def _read_workbook(dataset):
+    """
+    Lit les feuilles du classeur : depuis le store colonnaire si ce classeur a déjà été
+    chargé (même après un redémarrage), sinon depuis l'Excel, puis alimente le store.
+    """
+    if columnar_store.has_sheets(dataset.workbook_hash):
+        try:
+            sheets, sheet_names, excel_seconds, store_seconds = columnar_store.read_sheets(dataset.workbook_hash)
+            dataset.sheets, dataset.sheet_names = sheets, sheet_names
+            dataset.timings = {"excel": excel_seconds, "store": store_seconds}
+            if columnar_store.has_tracks(dataset.workbook_hash):
+                _map_tracks(dataset)
+            return
+        except Exception:
+            # Store illisible (version, disque) : on repart de l'Excel
+            pass
+    start = time.perf_counter()
+    excel_data = pd.ExcelFile(io.BytesIO(dataset.read_member(dataset.excel_member)))
+    dataset.sheet_names = list(excel_data.sheet_names)
+    dataset.sheets = {sheet: excel_data.parse(sheet) for sheet in SHEETS if sheet in dataset.sheet_names}
+    dataset.timings = {"excel": time.perf_counter() - start}
+    _decode_tracks(dataset)
+    try:
+        columnar_store.write_sheets(
+            dataset.workbook_hash, dataset.sheets, dataset.sheet_names, dataset.timings["excel"], tracks=dataset.tracks
+        )
+    except Exception:
+        # Le store n'est qu'une accélération : une erreur d'écriture ne bloque pas le chargement
+        return
+    if dataset.tracks is not None:
+        # Les positions décodées sont remplacées par leur version mappée : seules les pages lues restent en mémoire
+        _map_tracks(dataset)
+
+
+def _decode_tracks(dataset):
+    """Décode les colonnes X / Y de la feuille Vidéo en tableaux float32 et retire les textes "x1;x2;..."."""
+    video_data = dataset.sheets.get("Vidéo")
+    if video_data is not None and set(COORDINATE_COLUMNS) <= set(video_data.columns):
+        dataset.tracks = parse_tracks(video_data)
+        dataset.timings["tracks"] = dataset.tracks.seconds
+        dataset.sheets["Vidéo"] = video_data.drop(columns=list(COORDINATE_COLUMNS))
+
+
+def _map_tracks(dataset):
+    """
+    Mappe les positions vidéo depuis le store colonnaire. L'index (Joueur, Session Title) -> ligne
+    est reconstruit sur la feuille relue, pour avoir les mêmes types de clés que l'interface.
+    """
+    try:
+        x, y, offsets, errors, seconds = columnar_store.read_tracks(dataset.workbook_hash)
+    except Exception:
+        # Fichiers illisibles : on garde les positions décodées s'il y en a
+        return
+    video_data = dataset.video_data
+    if set(COORDINATE_COLUMNS) <= set(video_data.columns):
+        # Store complété après coup (write_tracks) : les textes X / Y sont encore dans la feuille
+        video_data = dataset.sheets["Vidéo"] = video_data.drop(columns=list(COORDINATE_COLUMNS))
+    dataset.tracks = TrackStore(
+        x=x, y=y, offsets=offsets, rows=track_rows(video_data), errors=errors, seconds=seconds
+    )
+    dataset.timings["tracks_store"] = seconds
+
+
+def _parse_archive(digest, zip_bytes):
+    dataset = ZipDataset(digest=digest, zip_bytes=zip_bytes)
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zip_ref:
+        dataset.excel_member, dataset.trombi_members = _index_members(zip_ref.namelist())
+        if dataset.excel_member is None:
+            return dataset
+        dataset.workbook_hash = content_hash(zip_ref.read(dataset.excel_member))
+    _read_workbook(dataset)
+    if dataset.tracks is None:
+        # Store écrit avant la conservation des positions : décodage des textes X / Y, puis ajout au store
+        _decode_tracks(dataset)
+        if dataset.tracks is not None and columnar_store.has_sheets(dataset.workbook_hash):
+            try:
+                columnar_store.write_tracks(dataset.workbook_hash, dataset.tracks)
+            except Exception:
+                pass
+    if "CSV" in dataset.sheets:
+        # Colonnes dérivées (féminines et masculines) calculées une fois pour toute la feuille
+        dataset.sheets["CSV"] = add_derived_metrics(dataset.sheets["CSV"])
+        dataset.index = PlayerIndex(dataset.data, dataset.positions, dataset.video_data)
+    return dataset
+
+
+def load_archive(zip_bytes):
+    """
+    Retourne le ZipDataset de l'archive ZIP (Excel + dossier Trombi) à partir de ses octets.
+    Les feuilles ne sont lues qu'une seule fois par contenu d'archive :
+    les appels suivants, y compris depuis d'autres sessions, réutilisent le cache.
+    """
+    digest = content_hash(zip_bytes)
+    return _archive_cache.get_or_create(
+        digest, lambda: _parse_archive(digest, zip_bytes), sizeof=ZipDataset.nbytes
+    )
+
+
+def archive_cache_stats():
+    return _archive_cache.stats()
+
+
+def format_load_timings(timings):
+    """Résumé lisible des temps de lecture Excel (à froid) et store colonnaire (à chaud)."""
+    excel_seconds = timings.get("excel")
+    store_seconds = timings.get("store")
+    if store_seconds is None:
+        return f"Lecture Excel : {excel_seconds:.2f} s (store colonnaire créé)" + _format_extra_timings(timings)
+    message = f"Lecture store colonnaire : {store_seconds:.3f} s"
+    if excel_seconds:
+        message += f" (Excel : {excel_seconds:.2f} s, gain x{excel_seconds / max(store_seconds, 1e-6):.0f})"
+    return message + _format_extra_timings(timings)
+
+
+def _format_extra_timings(timings):
+    message = ""
+    if "tracks" in timings:
+        message += f" ; positions vidéo décodées en {timings['tracks']:.3f} s"
+    if "tracks_store" in timings:
+        message += f" ; positions vidéo mappées depuis le store en {timings['tracks_store'] * 1000:.1f} ms"
+    return message
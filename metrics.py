@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+from typing import Callable
+
+import pandas as pd
+
+FEMININE = "Pôle Féminin"
+MASCULINE = "Pôle Masculin"
+
+ACC_COLUMNS = ["Nb Acc2>3m/s²", "Nb Acc3>4m/s²", "Nb Acc>4m/s²"]
+DEC_COLUMNS = ["Nb Dec2>3m/s²", "Nb Dec3>4m/s²", "Nb Dec>4m/s²"]
+
+
+@dataclass(frozen=True)
+class DerivedMetric:
+    """Colonne calculée à partir des colonnes de la feuille CSV."""
+    name: str
+    inputs: tuple
+    compute: Callable[[pd.DataFrame], pd.Series]
+    variant: str
+
+
+def _minutes(df):
+    return df["Durée"] / 60
+
+
+def _minutes_non_zero(df):
+    # Les formules masculines évitent la division par zéro sur les durées nulles
+    return df["Durée"].replace(0, 1) / 60
+
+
+# Ordre significatif : une métrique peut dépendre d'une métrique définie avant elle
+METRICS = [
+    # Pôle féminin
+    DerivedMetric("Accélérations > 2m/s²", tuple(ACC_COLUMNS),
+                  lambda df: df[ACC_COLUMNS].sum(axis=1), FEMININE),
+    DerivedMetric("Décélérations > 2m/s²", tuple(DEC_COLUMNS),
+                  lambda df: df[DEC_COLUMNS].sum(axis=1), FEMININE),
+    DerivedMetric("Distance > 19kmh/min", ("Distance19", "Durée"),
+                  lambda df: df["Distance19"] / _minutes(df), FEMININE),
+    DerivedMetric("Distance > 23km/h", ("Dist>23kmh",),
+                  lambda df: df["Dist>23kmh"] * 1000, FEMININE),  # Convertir en mètres
+    DerivedMetric("Distance>23kmh/min", ("Dist>23kmh", "Durée"),
+                  lambda df: (df["Dist>23kmh"] * 1000) / _minutes(df), FEMININE),
+    DerivedMetric("Nb Accélération > 2m/s²/min", tuple(ACC_COLUMNS) + ("Durée",),
+                  lambda df: df[ACC_COLUMNS].sum(axis=1) / _minutes(df), FEMININE),
+    DerivedMetric("Nb Décélération > 2m/s²/min", tuple(DEC_COLUMNS) + ("Durée",),
+                  lambda df: df[DEC_COLUMNS].sum(axis=1) / _minutes(df), FEMININE),
+    # Pôle masculin
+    DerivedMetric("Distance > 16km/h", ("Dist>16kmh",),
+                  lambda df: df["Dist>16kmh"], MASCULINE),
+    DerivedMetric("Distance > 20km/h", ("Dist>20kmh",),
+                  lambda df: df["Dist>20kmh"] * 1000, MASCULINE),
+    DerivedMetric("Distance>20kmh/min", ("Dist>20kmh", "Durée"),
+                  lambda df: (df["Dist>20kmh"] * 1000).fillna(0) / _minutes_non_zero(df), MASCULINE),
+    DerivedMetric("Distance>16kmh/min", ("Distance16", "Durée"),
+                  lambda df: df["Distance16"] / _minutes_non_zero(df), MASCULINE),
+    DerivedMetric("Nb Acc/Dec > 2m/s²", tuple(ACC_COLUMNS + DEC_COLUMNS),
+                  lambda df: df[ACC_COLUMNS + DEC_COLUMNS].sum(axis=1), MASCULINE),
+    DerivedMetric("Nb Acc/Dec > 2m/s²/min", ("Nb Acc/Dec > 2m/s²", "Durée"),
+                  lambda df: df["Nb Acc/Dec > 2m/s²"].fillna(0) / _minutes_non_zero(df), MASCULINE),
+    DerivedMetric("Nb Acc/Dec > 4m/s²", ("Nb Acc>4m/s²", "Nb Dec>4m/s²"),
+                  lambda df: df[["Nb Acc>4m/s²", "Nb Dec>4m/s²"]].sum(axis=1), MASCULINE),
+    DerivedMetric("Nb Acc/Dec > 4m/s²/min", ("Nb Acc/Dec > 4m/s²", "Durée"),
+                  lambda df: df["Nb Acc/Dec > 4m/s²"].fillna(0) / _minutes_non_zero(df), MASCULINE),
+]
+
+
+def metrics_for(variant):
+    return [metric for metric in METRICS if metric.variant == variant]
+
+
+def add_derived_metrics(data, variant=None):
+    """
+    Ajoute à data toutes les colonnes dérivées du registre (ou seulement celles de variant),
+    calculées en une passe vectorisée sur toute la feuille. Les métriques dont une entrée
+    manque sont ignorées. Retourne un nouveau DataFrame.
+    """
+    data = data.copy()
+    for metric in METRICS:
+        if variant is not None and metric.variant != variant:
+            continue
+        if all(col in data.columns for col in metric.inputs):
+            data[metric.name] = metric.compute(data)
+    return data
+
+
+# Graphiques proposés dans l'analyse GPS et les rapports PDF : (généraux, par minute)
+REPORT_GRAPHS = {
+    FEMININE: (
+        [
+            "Distance",
+            "Distance>19km/h",
+            "Distance > 23km/h",
+            "TopSpeed",
+            "Accélérations > 2m/s²",
+            "Décélérations > 2m/s²",
+            "Diagramme empilé"
+        ],
+        [
+            "Dist/min",
+            "Distance>23kmh/min",
+            "Distance > 19kmh/min",
+            "Nb Accélération > 2m/s²/min",
+            "Nb Décélération > 2m/s²/min"
+        ],
+    ),
+    MASCULINE: (
+        [
+            "Distance",
+            "Distance > 16km/h",
+            "Distance > 20km/h",
+            "TopSpeed",
+            "Nb Acc/Dec > 2m/s²",
+            "Nb Acc/Dec > 4m/s²",
+            "Diagramme empilé"
+        ],
+        [
+            "Dist/min",
+            "Distance>20kmh/min",
+            "Distance>16kmh/min",
+            "Nb Acc/Dec > 2m/s²/min",
+            "Nb Acc/Dec > 4m/s²/min"
+        ],
+    ),
+}
@@ -0,0 +1,341 @@
+"""
+Indicateurs de course calculés à partir des positions X/Y de la feuille Vidéo.
+
+Toutes les lignes (toutes les sessions de tous les joueurs) sont traitées ensemble, en NumPy
+vectorisé sur les tableaux plats de tracks.TrackStore : la vitesse, l'accélération et les
+efforts sont calculés sur l'ensemble des points, les limites entre lignes étant respectées
+grâce aux offsets, puis agrégés par ligne (np.add.reduceat, np.bincount). Les seuils sont
+ceux des indicateurs GPS de PFtest / PMtest, et les colonnes portent les mêmes noms que celles
+de la feuille CSV (ou des métriques dérivées), pour comparer la charge vidéo à la charge GPS.
+Les pics d'intensité (distance maximale sur toute fenêtre glissante de 1, 3 et 5 minutes)
+sont obtenus en O(n) par différences de sommes cumulées (voir compute_peak_windows).
+
+    python movement.py    # temps de calcul pour une équipe sur des matchs complets
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from metrics import FEMININE, MASCULINE
+from tracks import TRACK_SAMPLE_HZ
+
+# Seuils de vitesse (km/h) des bandes de course : (haute intensité, sprint)
+SPEED_THRESHOLDS = {FEMININE: (19, 23), MASCULINE: (16, 20)}
+# Seuils d'accélération / décélération (m/s²)
+ACCELERATION_THRESHOLDS = (2, 4)
+# Lissage (moyenne glissante centrée) de la vitesse puis de l'accélération, en secondes
+SPEED_SMOOTHING_SECONDS = 0.5
+ACCELERATION_SMOOTHING_SECONDS = 0.5
+# Durée minimale d'un effort au-dessus du seuil pour être compté
+MIN_SPRINT_SECONDS = 1.0
+MIN_ACCELERATION_SECONDS = 0.5
+# Fenêtres glissantes des pics d'intensité, en minutes
+PEAK_WINDOW_MINUTES = (1, 3, 5)
+MOVEMENT_CACHE_MAX_ENTRIES = int(os.environ.get("RAPPORT_MOVEMENT_CACHE_MAX_ENTRIES", 16))
+
+_movement_cache = LRUCache(MOVEMENT_CACHE_MAX_ENTRIES)
+
+
+def metric_columns(variant):
+    """Colonnes produites pour une variante, dans l'ordre d'affichage."""
+    high, sprint = SPEED_THRESHOLDS[variant]
+    low_acc, high_acc = ACCELERATION_THRESHOLDS
+    columns = ["Durée", "Distance", "Dist/min", "TopSpeed", f"Distance > {high}km/h", f"Distance > {sprint}km/h",
+               f"Sprints > {sprint}km/h"]
+    if variant == MASCULINE:
+        return columns + [f"Nb Acc/Dec > {low_acc}m/s²", f"Nb Acc/Dec > {high_acc}m/s²"]
+    return columns + [f"Accélérations > {low_acc}m/s²", f"Décélérations > {low_acc}m/s²",
+                      f"Accélérations > {high_acc}m/s²", f"Décélérations > {high_acc}m/s²"]
+
+
+def peak_graphs(variant, windows=PEAK_WINDOW_MINUTES):
+    """Colonnes des pics d'intensité (et graphiques proposés dans l'onglet GPS)."""
+    high, _ = SPEED_THRESHOLDS[variant]
+    return [name for minutes in windows
+            for name in (f"Distance max {minutes} min", f"Distance > {high}km/h max {minutes} min")]
+
+
+def _row_bounds(offsets):
+    """Début et fin (exclue) de la ligne de chaque point."""
+    lengths = np.diff(offsets)
+    return np.repeat(offsets[:-1], lengths), np.repeat(offsets[1:], lengths)
+
+
+def _invalid_rows(values, offsets):
+    """Lignes contenant au moins une valeur non finie (nan, inf)."""
+    rows = np.zeros(len(offsets) - 1, dtype=bool)
+    bad = ~np.isfinite(values)
+    nonempty = np.diff(offsets) > 0
+    if bad.any() and nonempty.any():
+        rows[nonempty] = np.add.reduceat(bad, offsets[:-1][nonempty]) > 0
+    return rows
+
+
+def _moving_average(values, half_window, starts, stops):
+    """
+    Moyenne glissante centrée de 2 * half_window + 1 points, tronquée aux limites de chaque ligne.
+    Une valeur non finie ne rend NaN que les moyennes dont la fenêtre la contient : la somme
+    cumulée porte sur toutes les lignes et ne doit pas propager NaN aux lignes suivantes.
+    """
+    if half_window <= 0:
+        return values
+    finite = np.isfinite(values)
+    cumulative = np.concatenate([[0.0], np.cumsum(np.where(finite, values, 0.0), dtype=np.float64)])
+    index = np.arange(len(values))
+    lo = np.maximum(index - half_window, starts)
+    hi = np.minimum(index + half_window + 1, stops)
+    averages = (cumulative[hi] - cumulative[lo]) / (hi - lo)
+    if not finite.all():
+        bad = np.concatenate([[0], np.cumsum(~finite)])
+        averages[bad[hi] > bad[lo]] = np.nan
+    return averages
+
+
+def _count_efforts(mask, offsets, min_samples):
+    """Nombre de séquences d'au moins min_samples points consécutifs à True, par ligne."""
+    rows = len(offsets) - 1
+    if not mask.any():
+        return np.zeros(rows, dtype=np.int64)
+    # Une séquence ne traverse jamais la limite entre deux lignes
+    breaks = np.zeros(len(mask) + 1, dtype=bool)
+    breaks[offsets] = True
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.diff(padded.astype(np.int8))
+    run_starts = np.flatnonzero((edges[:-1] == 1) | (mask & breaks[:-1] & padded[:-2]))
+    run_stops = np.flatnonzero((edges[1:] == -1) | (mask & breaks[1:] & padded[2:])) + 1
+    long_runs = run_starts[(run_stops - run_starts) >= min_samples]
+    return np.bincount(np.searchsorted(offsets, long_runs, side="right") - 1, minlength=rows)
+
+
+def _kinematics(x, y, offsets, sample_hz):
+    """
+    Vitesse lissée (m/s) et accélération lissée (m/s²) de chaque point, et lignes invalides
+    (coordonnée non finie) ; les différences et les moyennes glissantes ne franchissent pas les
+    limites entre lignes. Les pas d'une ligne invalide sont mis à zéro : ses indicateurs sont à
+    écarter (voir compute_movement), mais elle ne perturbe pas les autres lignes.
+    """
+    lengths = np.diff(offsets)
+    starts, stops = _row_bounds(offsets)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    invalid = _invalid_rows(x, offsets) | _invalid_rows(y, offsets)
+    # Pas entre deux points consécutifs ; nul au premier point de chaque ligne
+    step = np.zeros(len(x))
+    step[1:] = np.hypot(np.diff(x), np.diff(y))
+    step[offsets[:-1][lengths > 0]] = 0.0
+    step[~np.isfinite(step)] = 0.0
+    speed = _moving_average(step * sample_hz, int(SPEED_SMOOTHING_SECONDS * sample_hz / 2), starts, stops)
+    acceleration = np.zeros(len(x))
+    acceleration[1:] = np.diff(speed) * sample_hz
+    acceleration[offsets[:-1][lengths > 0]] = 0.0
+    acceleration = _moving_average(acceleration, int(ACCELERATION_SMOOTHING_SECONDS * sample_hz / 2), starts, stops)
+    return speed, acceleration, invalid
+
+
+def compute_movement(x, y, offsets, variant=FEMININE, sample_hz=TRACK_SAMPLE_HZ):
+    """
+    Indicateurs de course de chaque ligne (offsets[i]:offsets[i + 1] dans x et y, en mètres).
+    Retourne un DataFrame d'une ligne par ligne de offsets, colonnes metric_columns(variant) ;
+    distances en mètres, vitesses en km/h. Les lignes à coordonnées non finies ont des valeurs
+    manquantes.
+    """
+    high, sprint = SPEED_THRESHOLDS[variant]
+    low_acc, high_acc = ACCELERATION_THRESHOLDS
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    speed, acceleration, invalid = _kinematics(x, y, offsets, sample_hz)
+    speed_kmh = speed * 3.6
+
+    # Distance intégrée sur la vitesse lissée, comme les bandes de vitesse
+    distance = speed / sample_hz
+    nonempty = lengths > 0
+    reduce_at = offsets[:-1][nonempty]
+
+    def per_row(values):
+        totals = np.zeros(len(lengths))
+        if len(reduce_at):
+            totals[nonempty] = np.add.reduceat(values, reduce_at)
+        return totals
+
+    duration = lengths / sample_hz
+    total = per_row(distance)
+    top_speed = np.zeros(len(lengths))
+    if len(reduce_at):
+        top_speed[nonempty] = np.maximum.reduceat(speed_kmh, reduce_at)
+    sprint_samples = max(1, int(round(MIN_SPRINT_SECONDS * sample_hz)))
+    effort_samples = max(1, int(round(MIN_ACCELERATION_SECONDS * sample_hz)))
+    values = {
+        "Durée": duration,
+        "Distance": total,
+        "Dist/min": np.divide(total, duration / 60, out=np.zeros_like(total), where=duration > 0),
+        "TopSpeed": top_speed,
+        f"Distance > {high}km/h": per_row(np.where(speed_kmh > high, distance, 0.0)),
+        f"Distance > {sprint}km/h": per_row(np.where(speed_kmh > sprint, distance, 0.0)),
+        f"Sprints > {sprint}km/h": _count_efforts(speed_kmh > sprint, offsets, sprint_samples),
+    }
+    efforts = {
+        threshold: (_count_efforts(acceleration > threshold, offsets, effort_samples),
+                    _count_efforts(acceleration < -threshold, offsets, effort_samples))
+        for threshold in ACCELERATION_THRESHOLDS
+    }
+    if variant == MASCULINE:
+        values[f"Nb Acc/Dec > {low_acc}m/s²"] = sum(efforts[low_acc])
+        values[f"Nb Acc/Dec > {high_acc}m/s²"] = sum(efforts[high_acc])
+    else:
+        values[f"Accélérations > {low_acc}m/s²"], values[f"Décélérations > {low_acc}m/s²"] = efforts[low_acc]
+        values[f"Accélérations > {high_acc}m/s²"], values[f"Décélérations > {high_acc}m/s²"] = efforts[high_acc]
+    result = pd.DataFrame(values, columns=metric_columns(variant))
+    result.loc[invalid] = np.nan
+    return result
+
+
+def rolling_maxima(values, offsets, window):
+    """
+    Somme maximale de values sur une fenêtre de window points consécutifs, pour chaque ligne,
+    en O(n) : somme de la fenêtre [i, i + window) = cumul[i + window] - cumul[i]. Les fenêtres
+    sont tronquées à la fin de leur ligne (une ligne plus courte que window donne son total).
+    Une ligne contenant une valeur non finie vaut NaN, sans effet sur les autres lignes.
+    """
+    rows = len(offsets) - 1
+    maxima = np.zeros(rows)
+    lengths = np.diff(offsets)
+    nonempty = lengths > 0
+    if not nonempty.any():
+        return maxima
+    # Somme cumulée commune à toutes les lignes : les valeurs non finies en sont exclues
+    finite = np.isfinite(values)
+    cumulative = np.concatenate([[0.0], np.cumsum(np.where(finite, values, 0.0), dtype=np.float64)])
+    _, stops = _row_bounds(offsets)
+    index = np.arange(len(values))
+    sums = cumulative[np.minimum(index + window, stops)] - cumulative[index]
+    maxima[nonempty] = np.maximum.reduceat(sums, offsets[:-1][nonempty])
+    maxima[_invalid_rows(values, offsets)] = np.nan
+    return maxima
+
+
+def compute_peak_windows(x, y, offsets, variant=FEMININE, sample_hz=TRACK_SAMPLE_HZ, windows=PEAK_WINDOW_MINUTES):
+    """
+    Pics d'intensité de chaque ligne : distance et distance au-dessus du premier seuil de vitesse
+    maximales sur toute fenêtre glissante de chaque durée de windows (minutes), en mètres.
+    Retourne un DataFrame d'une ligne par ligne de offsets, colonnes peak_graphs(variant, windows) ;
+    les lignes à coordonnées non finies ont des valeurs manquantes (et non 0).
+    """
+    high, _ = SPEED_THRESHOLDS[variant]
+    offsets = np.asarray(offsets, dtype=np.int64)
+    speed, _, invalid = _kinematics(x, y, offsets, sample_hz)
+    distance = speed / sample_hz
+    # NaN propagé dans les lignes invalides : "nan > seuil" vaut False et donnerait 0
+    distance[np.repeat(invalid, np.diff(offsets))] = np.nan
+    high_distance = np.where(speed * 3.6 > high, distance, 0.0)
+    high_distance[np.isnan(distance)] = np.nan
+    values = {}
+    for minutes in windows:
+        window = max(1, int(round(minutes * 60 * sample_hz)))
+        values[f"Distance max {minutes} min"] = rolling_maxima(distance, offsets, window)
+        values[f"Distance > {high}km/h max {minutes} min"] = rolling_maxima(high_distance, offsets, window)
+    return pd.DataFrame(values, columns=peak_graphs(variant, windows))
+
+
+def _per_session(dataset, compute):
+    """Applique compute(x, y, offsets) à toutes les lignes, puis garde une ligne par (Joueur, Session Title)."""
+    if dataset.tracks is None:
+        raise ValueError("La feuille Vidéo ne contient pas de colonnes X et Y.")
+    start = time.perf_counter()
+    tracks = dataset.tracks
+    metrics = compute(tracks.x, tracks.y, tracks.offsets)
+    metrics.loc[list(tracks.errors)] = np.nan
+    rows = list(tracks.rows.values())
+    result = metrics.iloc[rows].reset_index(drop=True)
+    result.insert(0, "Session Title", [session for _, session in tracks.rows])
+    result.insert(0, "Joueur", [player for player, _ in tracks.rows])
+    result.attrs["seconds"] = time.perf_counter() - start
+    result.attrs["points"] = len(tracks.x)
+    return result
+
+
+def squad_movement(dataset, variant=FEMININE, sample_hz=TRACK_SAMPLE_HZ):
+    """
+    Indicateurs de course de toutes les sessions de la feuille Vidéo (une ligne par
+    (Joueur, Session Title)), calculés en une passe et mis en cache par (archive, variante).
+    Les sessions aux coordonnées invalides ont des valeurs manquantes.
+    """
+    return _movement_cache.get_or_create(
+        (dataset.digest, "movement", variant, sample_hz),
+        lambda: _per_session(dataset, lambda x, y, offsets: compute_movement(x, y, offsets, variant, sample_hz)),
+        sizeof=lambda _: 1
+    )
+
+
+def squad_peak_windows(dataset, variant=FEMININE, sample_hz=TRACK_SAMPLE_HZ):
+    """
+    Pics d'intensité de toutes les sessions de la feuille Vidéo, pour toute l'équipe en une passe,
+    mis en cache par (archive, variante).
+    """
+    return _movement_cache.get_or_create(
+        (dataset.digest, "peaks", variant, sample_hz),
+        lambda: _per_session(dataset, lambda x, y, offsets: compute_peak_windows(x, y, offsets, variant, sample_hz)),
+        sizeof=lambda _: 1
+    )
+
+
+def with_peak_windows(player_data, dataset, variant=FEMININE):
+    """
+    Tranche CSV d'un joueur complétée par ses pics d'intensité vidéo (jointure sur Session Title),
+    pour les tracer avec les graphiques GPS. Sans positions vidéo, player_data est retourné tel quel.
+    """
+    if dataset.tracks is None or player_data.empty:
+        return player_data
+    peaks = squad_peak_windows(dataset, variant)
+    player_peaks = peaks[peaks["Joueur"] == player_data["Joueur"].iloc[0]].drop(columns="Joueur")
+    player_peaks = player_peaks.drop_duplicates("Session Title").set_index("Session Title")
+    return player_data.join(player_peaks, on="Session Title")
+
+
+def peak_rows(player_data, graph):
+    """
+    Sessions à tracer pour graph : pour un pic d'intensité, seules celles qui ont une valeur.
+    Une session sans positions vidéo (ou aux coordonnées invalides) est absente du graphique
+    au lieu d'être tracée à 0 et de fausser la tendance.
+    """
+    if graph in player_data.columns and graph in peak_graphs(FEMININE) + peak_graphs(MASCULINE):
+        return player_data.dropna(subset=[graph])
+    return player_data
+
+
+def compare_with_gps(movement, data):
+    """
+    Met côte à côte les indicateurs vidéo et les colonnes de même nom de la feuille CSV, par
+    (Joueur, Session Title). Retourne un DataFrame avec, pour chaque indicateur commun,
+    les colonnes "<nom> (vidéo)", "<nom> (GPS)" et "<nom> écart %".
+    """
+    keys = ["Joueur", "Session Title"]
+    common = [col for col in movement.columns if col not in keys and col in data.columns]
+    merged = movement[keys + common].merge(
+        data[keys + common].drop_duplicates(keys), on=keys, how="inner", suffixes=(" (vidéo)", " (GPS)")
+    )
+    columns = list(keys)
+    for col in common:
+        video, gps = merged[f"{col} (vidéo)"], merged[f"{col} (GPS)"]
+        merged[f"{col} écart %"] = (video - gps) / gps.where(gps != 0) * 100
+        columns += [f"{col} (vidéo)", f"{col} (GPS)", f"{col} écart %"]
+    return merged[columns]
+
+
+def benchmark(players=25, minutes=95, sample_hz=TRACK_SAMPLE_HZ):
+    """Temps (s) du calcul pour une équipe de players joueurs sur un match de minutes minutes."""
+    rng = np.random.default_rng(0)
+    n = int(minutes * 60 * sample_hz)
+    velocity = rng.normal(0, 0.15, (2, players * n))
+    x = np.clip(50 + np.cumsum(velocity[0]), 0, 105).astype(np.float32)
+    y = np.clip(34 + np.cumsum(velocity[1]), 0, 68).astype(np.float32)
+    offsets = np.arange(players + 1, dtype=np.int64) * n
+    start = time.perf_counter()
+    compute_movement(x, y, offsets, FEMININE, sample_hz)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"25 joueurs x 95 min à {TRACK_SAMPLE_HZ:g} Hz : {benchmark():.2f} s")
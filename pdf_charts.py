@@ -0,0 +1,281 @@
+"""
+Dessin vectoriel des graphiques du rapport directement avec les primitives FPDF.
+
+Les figures Plotly produites par plot_feminine_graph / plot_masculine_graph sont relues
+(traces, couleurs, titres) et redessinées dans le PDF : courbes avec marqueurs, droite de
+progression, ligne de norme en pointillés et diagrammes empilés. Aucun PNG n'est produit,
+Kaleido n'est donc plus nécessaire et le PDF reste léger.
+"""
+import math
+
+import numpy as np
+from PIL import ImageColor
+
+# Couleurs reprises du thème Plotly par défaut
+PAPER_COLOR = (255, 255, 255)
+PLOT_COLOR = (229, 236, 246)
+GRID_COLOR = (255, 255, 255)
+TEXT_COLOR = (42, 63, 95)
+DEFAULT_COLORWAY = ("#636efa", "#EF553B", "#00cc96", "#ab63fa", "#FFA15A",
+                    "#19d3f3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52")
+
+# Le thème Plotly de Streamlit utilise des couleurs provisoires (#000001 à #000010) que seul le
+# navigateur remplace : on les traduit ici par la palette catégorielle claire de Streamlit
+STREAMLIT_CATEGORY_COLORS = {
+    f"#{i + 1:06d}": color for i, color in enumerate((
+        "#0068c9", "#83c9ff", "#ff2b2b", "#ffabab", "#29b09d",
+        "#7defa1", "#ff8700", "#ffd16a", "#6d3fc0", "#d5dae5",
+    ))
+}
+
+SUPPORTED_TRACES = ("scatter", "bar")
+MAX_LABEL_CHARS = 28
+
+
+def _pdf_text(value):
+    """Texte compatible avec les polices standard de FPDF (latin-1)."""
+    return str(value).encode("latin-1", "replace").decode("latin-1")
+
+
+def _rgb(color, fallback):
+    if isinstance(color, str):
+        color = STREAMLIT_CATEGORY_COLORS.get(color.lower(), color)
+        try:
+            return ImageColor.getrgb(color)[:3]
+        except ValueError:
+            pass
+    return ImageColor.getrgb(STREAMLIT_CATEGORY_COLORS.get(fallback.lower(), fallback))[:3]
+
+
+def _trace_color(fig, trace, position):
+    colorway = fig.layout.template.layout.colorway if fig.layout.template else None
+    colorway = colorway or DEFAULT_COLORWAY
+    fallback = colorway[position % len(colorway)]
+    if trace.type == "scatter" and trace.line.color is not None:
+        return _rgb(trace.line.color, fallback)
+    return _rgb(trace.marker.color, fallback)
+
+
+def _nice_ticks(low, high, count=5):
+    """Graduations « rondes » (1, 2, 2.5, 5 x 10^n) couvrant [low, high]."""
+    if not high > low:
+        low, high = low - 1, high + 1
+    raw_step = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw_step)
+    start = math.floor(low / step) * step
+    end = math.ceil(high / step) * step
+    ticks = np.arange(start, end + step / 2, step)
+    decimals = max(0, -math.floor(math.log10(step)) + (1 if step / magnitude == 2.5 else 0))
+    return ticks, [f"{tick:.{decimals}f}" for tick in ticks]
+
+
+def _format_value(value):
+    return f"{value:.4g}"
+
+
+def _categories(traces):
+    """Catégories de l'axe x dans l'ordre d'apparition (comme un axe catégoriel Plotly)."""
+    categories = {}
+    for trace in traces:
+        for value in trace.x if trace.x is not None else []:
+            categories.setdefault(str(value), len(categories))
+    return categories
+
+
+def _values(trace):
+    return np.asarray(trace.y if trace.y is not None else [], dtype=float)
+
+
+def _value_range(fig, traces, categories):
+    """Étendue de l'axe y : somme des piles pour les barres empilées, valeurs brutes sinon."""
+    stacked = fig.layout.barmode in ("stack", "relative")
+    positive = np.zeros(len(categories))
+    negative = np.zeros(len(categories))
+    values = []
+    for trace in traces:
+        y = _values(trace)
+        if trace.type == "bar":
+            x = np.array([categories[str(v)] for v in trace.x])
+            y = np.nan_to_num(y)
+            if stacked:
+                np.add.at(positive, x, np.clip(y, 0, None))
+                np.add.at(negative, x, np.clip(y, None, 0))
+            else:
+                values.extend([0.0, *y])
+        else:
+            values.extend(y[np.isfinite(y)])
+    if stacked and any(trace.type == "bar" for trace in traces):
+        values.extend([*positive, *negative])
+    if not values:
+        return None
+    return float(np.min(values)), float(np.max(values))
+
+
+def _legend_rows(pdf, entries, width):
+    """Répartit les entrées de légende (nom, couleur, type) sur des lignes de largeur width."""
+    rows, row, row_width = [], [], 0.0
+    for entry in entries:
+        entry_width = 6 + pdf.get_string_width(entry[0]) + 3
+        if row and row_width + entry_width > width:
+            rows.append(row)
+            row, row_width = [], 0.0
+        row.append((entry, entry_width))
+        row_width += entry_width
+    if row:
+        rows.append(row)
+    return rows
+
+
+def _visible_traces(fig):
+    return [trace for trace in fig.data if trace.visible in (None, True)]
+
+
+def supports_figure(fig):
+    """Vrai si draw_figure sait dessiner fig (sinon l'appelant la rastérise en PNG)."""
+    traces = _visible_traces(fig)
+    if not traces or any(trace.type not in SUPPORTED_TRACES for trace in traces):
+        return False
+    categories = _categories(traces)
+    return bool(categories) and _value_range(fig, traces, categories) is not None
+
+
+def draw_figure(pdf, fig, x, y, w, h):
+    """
+    Dessine la figure Plotly fig (voir supports_figure) dans le rectangle (x, y, w, h) en mm
+    de la page courante. Les couleurs et la police de pdf sont modifiées : l'appelant
+    rétablit les siennes si besoin.
+    """
+    traces = _visible_traces(fig)
+    categories = _categories(traces)
+    ticks, tick_labels = _nice_ticks(*_value_range(fig, traces, categories))
+    y_low, y_high = ticks[0], ticks[-1]
+    labels = [_pdf_text(c if len(c) <= MAX_LABEL_CHARS else c[:MAX_LABEL_CHARS - 3] + "...") for c in categories]
+    title = _pdf_text(fig.layout.title.text or "")
+    x_title = _pdf_text(fig.layout.xaxis.title.text or "")
+    y_title = _pdf_text(fig.layout.yaxis.title.text or "")
+    colors = [_trace_color(fig, trace, i) for i, trace in enumerate(traces)]
+
+    # Mise en page : titre, légende, zone de tracé, étiquettes inclinées à 45°
+    pdf.set_font("Arial", size=6)
+    legend = _legend_rows(
+        pdf, [(_pdf_text(t.name), c, t.type) for t, c in zip(traces, colors) if t.name and t.showlegend is not False],
+        w - 8
+    )
+    tick_width = max(pdf.get_string_width(label) for label in tick_labels)
+    label_depth = max(pdf.get_string_width(label) for label in labels) * math.sqrt(0.5)
+    plot_left = x + (5 if y_title else 2) + tick_width + 1.5
+    plot_right = x + w - 3
+    plot_top = y + (8 if title else 3) + 4 * len(legend) + 1
+    plot_bottom = y + h - min(label_depth + 2.5 + (4 if x_title else 0), h * 0.4)
+    plot_width, plot_height = plot_right - plot_left, plot_bottom - plot_top
+    slot = plot_width / len(categories)
+
+    def x_pos(category):
+        return plot_left + slot * (categories[str(category)] + 0.5)
+
+    def y_pos(value):
+        return plot_bottom - (value - y_low) / (y_high - y_low) * plot_height
+
+    # Fond, grille et axes
+    pdf.set_fill_color(*PAPER_COLOR)
+    pdf.rect(x, y, w, h, style="F")
+    pdf.set_fill_color(*PLOT_COLOR)
+    pdf.rect(plot_left, plot_top, plot_width, plot_height, style="F")
+    pdf.set_draw_color(*GRID_COLOR)
+    pdf.set_line_width(0.2)
+    pdf.set_text_color(*TEXT_COLOR)
+    for tick, label in zip(ticks, tick_labels):
+        tick_y = y_pos(tick)
+        pdf.line(plot_left, tick_y, plot_right, tick_y)
+        pdf.text(plot_left - 1 - pdf.get_string_width(label), tick_y + 0.8, label)
+    for label, category in zip(labels, categories):
+        label_x = x_pos(category)
+        pdf.rotate(-45, label_x, plot_bottom + 2)
+        pdf.text(label_x, plot_bottom + 2, label)
+        pdf.rotate(0)
+
+    # Barres (empilées ou groupées)
+    bar_traces = [i for i, trace in enumerate(traces) if trace.type == "bar"]
+    stacked = fig.layout.barmode in ("stack", "relative")
+    bar_width = slot * 0.8 / (1 if stacked or not bar_traces else len(bar_traces))
+    positive_base = np.zeros(len(categories))
+    negative_base = np.zeros(len(categories))
+    pdf.set_font("Arial", size=5)
+    for group, i in enumerate(bar_traces):
+        trace, color = traces[i], colors[i]
+        show_text = trace.texttemplate is not None or trace.text is not None
+        text_color = (255, 255, 255) if sum(color) < 384 else (0, 0, 0)
+        pdf.set_fill_color(*color)
+        for category, value in zip(trace.x, np.nan_to_num(_values(trace))):
+            slot_index = categories[str(category)]
+            if stacked:
+                bases = positive_base if value >= 0 else negative_base
+                bottom, top = bases[slot_index], bases[slot_index] + value
+                bases[slot_index] = top
+                left = x_pos(category) - bar_width / 2
+            else:
+                bottom, top = 0.0, value
+                left = x_pos(category) - slot * 0.4 + group * bar_width
+            y_top, y_bottom = sorted((y_pos(top), y_pos(bottom)))
+            if y_bottom - y_top <= 0:
+                continue
+            pdf.rect(left, y_top, bar_width, y_bottom - y_top, style="F")
+            text = _format_value(value)
+            if show_text and y_bottom - y_top >= 2.5 and pdf.get_string_width(text) <= bar_width:
+                pdf.set_text_color(*text_color)
+                pdf.text(left + (bar_width - pdf.get_string_width(text)) / 2, (y_top + y_bottom) / 2 + 0.9, text)
+        pdf.set_text_color(*TEXT_COLOR)
+
+    # Courbes : segments consécutifs (interrompus sur les valeurs manquantes) et marqueurs
+    for i, trace in enumerate(traces):
+        if trace.type != "scatter":
+            continue
+        mode = trace.mode or "lines"
+        points = [(x_pos(cx), y_pos(cy)) if np.isfinite(cy) else None for cx, cy in zip(trace.x, _values(trace))]
+        pdf.set_draw_color(*colors[i])
+        pdf.set_fill_color(*colors[i])
+        pdf.set_line_width(0.35)
+        if "lines" in mode:
+            dashed = trace.line.dash not in (None, "solid")
+            for start, end in zip(points, points[1:]):
+                if start is None or end is None:
+                    continue
+                if dashed:
+                    pdf.dashed_line(*start, *end, dash_length=1.5, space_length=1)
+                else:
+                    pdf.line(*start, *end)
+        if "markers" in mode:
+            for point in points:
+                if point is not None:
+                    pdf.ellipse(point[0] - 0.6, point[1] - 0.6, 1.2, 1.2, style="F")
+
+    # Titres et légende
+    pdf.set_text_color(*TEXT_COLOR)
+    if y_title:
+        pdf.set_font("Arial", size=6)
+        title_y = plot_top + (plot_height + pdf.get_string_width(y_title)) / 2
+        pdf.rotate(90, x + 3.5, title_y)
+        pdf.text(x + 3.5, title_y, y_title)
+        pdf.rotate(0)
+    if x_title:
+        pdf.set_font("Arial", size=6)
+        pdf.text(plot_left + (plot_width - pdf.get_string_width(x_title)) / 2, y + h - 1.5, x_title)
+    if title:
+        pdf.set_font("Arial", style="B", size=9)
+        pdf.text(x + 3, y + 5.5, title)
+    pdf.set_font("Arial", size=6)
+    legend_y = y + (8 if title else 3) + 2
+    for row in legend:
+        legend_x = x + 4
+        for (name, color, trace_type), entry_width in row:
+            pdf.set_fill_color(*color)
+            pdf.set_draw_color(*color)
+            if trace_type == "bar":
+                pdf.rect(legend_x, legend_y - 1.5, 4, 2, style="F")
+            else:
+                pdf.set_line_width(0.35)
+                pdf.line(legend_x, legend_y - 0.5, legend_x + 4, legend_y - 0.5)
+            pdf.text(legend_x + 5, legend_y + 0.5, name)
+            legend_x += entry_width
+        legend_y += 4
@@ -0,0 +1,153 @@
+import io
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PIL import Image
+
+# Nombre de processus de rendu Kaleido gardés chauds (chacun a son propre navigateur)
+RENDERER_WORKERS = int(os.environ.get("RAPPORT_RENDERER_WORKERS", min(4, os.cpu_count() or 1)))
+
+# "vector" : graphiques dessinés directement dans le PDF (pdf_charts) ; "png" : rastérisés par Kaleido
+CHART_BACKEND = os.environ.get("RAPPORT_PDF_CHARTS", "vector")
+
+
+def _render_png(fig_json, width, height, scale):
+    """Exécuté dans un processus de rendu : figure Plotly (JSON) -> octets PNG."""
+    import plotly.io as pio
+    fig = pio.from_json(fig_json)
+    return fig.to_image(format="png", width=width, height=height, scale=scale)
+
+
+def _warm_up():
+    """Premier rendu d'une figure vide pour démarrer Kaleido avant la première demande."""
+    import plotly.graph_objects as go
+    go.Figure().to_image(format="png", width=10, height=10)
+    return os.getpid()
+
+
+class RendererPool:
+    """
+    Pool de processus de rendu PNG réutilisables, démarrés en arrière-plan au lancement
+    de l'application : le démarrage à froid de Kaleido n'est plus payé pendant la
+    génération d'un rapport, et les graphiques d'un rapport sont rendus en parallèle.
+    Les processus sont lancés en mode "spawn" pour ne pas dupliquer le serveur Streamlit.
+    """
+
+    def __init__(self, workers=RENDERER_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Démarre les processus et lance leur préchauffage sans attendre la fin."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                for _ in range(self.workers):
+                    self._executor.submit(_warm_up)
+            return self._executor
+
+    def render_many(self, figures, width=800, height=600, scale=2):
+        """
+        Rend une liste de figures Plotly en PNG, en parallèle, et retourne les octets PNG
+        dans le même ordre. Si le pool est inutilisable, le rendu se fait dans le processus courant.
+        """
+        payloads = [fig.to_json() for fig in figures]
+        try:
+            executor = self.start()
+            futures = [executor.submit(_render_png, payload, width, height, scale) for payload in payloads]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            with self._lock:
+                self._executor = None
+            return [_render_png(payload, width, height, scale) for payload in payloads]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+class InProcessRenderer:
+    """Rendu séquentiel dans le processus courant (processus de génération par lot, déjà parallélisés)."""
+
+    def render_many(self, figures, width=800, height=600, scale=2):
+        return [_render_png(fig.to_json(), width, height, scale) for fig in figures]
+
+
+_renderer_pool = RendererPool()
+
+
+def get_renderer_pool():
+    return _renderer_pool
+
+
+def start_renderer_pool():
+    """
+    À appeler au démarrage de l'application (idempotent). Avec le rendu vectoriel, Kaleido ne
+    sert qu'en secours pour les figures non prises en charge : le pool démarre alors à la demande.
+    """
+    if CHART_BACKEND == "png":
+        _renderer_pool.start()
+
+
+def _flate_rows(pixels):
+    """Lignes d'octets précédées du filtre PNG 0 (aucun), compressées pour /Predictor 15."""
+    height = pixels.shape[0]
+    rows = pixels.reshape(height, -1)
+    filtered = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rows], axis=1)
+    return zlib.compress(filtered.tobytes())
+
+
+def add_image_bytes(pdf, name, content):
+    """
+    Enregistre une image (octets PNG/JPEG) comme ressource du PDF sous le nom name, sans
+    passer par un fichier temporaire. pdf.image(name, ...) peut ensuite la placer autant
+    de fois que voulu : FPDF réutilise la même ressource pour toutes les occurrences.
+    Un JPEG RGB ou en niveaux de gris est intégré tel quel (DCTDecode), sans décodage.
+    La transparence éventuelle est convertie en masque (SMask) de façon vectorisée.
+    """
+    if name in pdf.images:
+        return name
+    with Image.open(io.BytesIO(content)) as img:
+        if img.format == "JPEG" and img.mode in ("RGB", "L"):
+            pdf.images[name] = {
+                "w": img.width,
+                "h": img.height,
+                "cs": "DeviceRGB" if img.mode == "RGB" else "DeviceGray",
+                "bpc": 8,
+                "f": "DCTDecode",
+                "data": content,
+                "i": len(pdf.images) + 1,
+            }
+            return name
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+        pixels = np.asarray(img, dtype=np.uint8)
+    width = pixels.shape[1]
+    info = {
+        "w": width,
+        "h": pixels.shape[0],
+        "cs": "DeviceRGB",
+        "bpc": 8,
+        "f": "FlateDecode",
+        "dp": f"/Predictor 15 /Colors 3 /BitsPerComponent 8 /Columns {width}",
+        "pal": "",
+        "trns": "",
+        "data": _flate_rows(np.ascontiguousarray(pixels[:, :, :3])),
+    }
+    if has_alpha:
+        info["smask"] = _flate_rows(np.ascontiguousarray(pixels[:, :, 3]))
+        if pdf.pdf_version < "1.4":
+            pdf.pdf_version = "1.4"
+    info["i"] = len(pdf.images) + 1
+    pdf.images[name] = info
+    return name
@@ -0,0 +1,99 @@
+import numpy as np
+
+MIN_MATCH_DURATION = 3900
+
+
+def normalize_name(name):
+    return str(name).strip().lower()
+
+
+class PlayerIndex:
+    """
+    Index construit une fois au chargement pour remplacer les filtrages par masque booléen :
+      - joueur -> positions des lignes dans la feuille CSV (toutes / matchs >= 3900 s)
+      - joueur (exact ou normalisé) -> ligne de la feuille Poste
+      - (joueur, session) -> positions des lignes dans la feuille Vidéo
+    Les recherches sont des accès dictionnaire suivis d'un iloc sur les positions.
+    """
+
+    def __init__(self, data, positions=None, video_data=None, min_duration=MIN_MATCH_DURATION):
+        self.data = data
+        self.video_data = video_data
+        self.min_duration = min_duration
+        self.players = data["Joueur"].drop_duplicates().tolist() if "Joueur" in data.columns else []
+
+        self._rows = {}
+        self._long_rows = {}
+        if "Joueur" in data.columns:
+            long_match = (data["Durée"] >= min_duration).to_numpy() if "Durée" in data.columns else None
+            for player, rows in data.groupby("Joueur", sort=False).indices.items():
+                self._rows[player] = rows
+                self._long_rows[player] = rows[long_match[rows]] if long_match is not None else rows
+
+        # Première ligne Poste par nom exact et par nom normalisé (comme .iloc[0] après filtrage)
+        self._poste = {}
+        self._poste_norm = {}
+        if positions is not None and "Joueur" in positions.columns:
+            for record in reversed(positions.to_dict("records")):
+                self._poste[record["Joueur"]] = record
+                self._poste_norm[normalize_name(record["Joueur"])] = record
+
+        self._video_rows = {}
+        self._video_sessions = {}
+        self._session_players = {}
+        if video_data is not None and {"Joueur", "Session Title"} <= set(video_data.columns):
+            groups = video_data.groupby(["Joueur", "Session Title"], sort=False, dropna=False).indices
+            for (player, session), rows in groups.items():
+                self._video_rows[(player, session)] = rows
+                self._video_sessions.setdefault(player, []).append(session)
+                self._session_players.setdefault(session, []).append(player)
+
+    def rows(self, player, min_duration=None):
+        """
+        Lignes CSV du joueur. Avec min_duration=self.min_duration, seuls les matchs
+        d'au moins 3900 s sont renvoyés (tranche précalculée).
+        """
+        if min_duration is None:
+            positions = self._rows.get(player)
+        elif min_duration == self.min_duration:
+            positions = self._long_rows.get(player)
+        else:
+            positions = self._rows.get(player)
+            if positions is not None:
+                positions = positions[(self.data["Durée"].to_numpy()[positions] >= min_duration)]
+        if positions is None:
+            return self.data.iloc[0:0]
+        return self.data.iloc[positions]
+
+    def poste_row(self, player):
+        """Ligne de la feuille Poste pour ce nom exact (dict), ou None."""
+        return self._poste.get(player)
+
+    def poste_row_normalized(self, player):
+        """Ligne de la feuille Poste en ignorant la casse et les espaces autour du nom."""
+        return self._poste_norm.get(normalize_name(player))
+
+    def position_of(self, player, default=None):
+        row = self._poste.get(player)
+        return row["Poste"] if row is not None and "Poste" in row else default
+
+    def video_sessions(self, player):
+        return list(self._video_sessions.get(player, []))
+
+    def video_players(self, session):
+        """Joueurs ayant des lignes Vidéo pour cette session."""
+        return list(self._session_players.get(session, []))
+
+    def video_rows(self, player, session):
+        """Lignes de la feuille Vidéo pour ce joueur et cette session."""
+        positions = self._video_rows.get((player, session), np.empty(0, dtype=np.intp))
+        return self.video_data.iloc[positions]
+
+
+def player_position(player, positions, index=None):
+    """Poste du joueur (première ligne de la feuille Poste), via l'index s'il est fourni ; None si absent."""
+    if index is not None:
+        row = index.poste_row(player)
+        return row.get("Poste") if row is not None else None
+    position_row = positions[positions["Joueur"] == player]
+    return position_row.iloc[0]["Poste"] if not position_row.empty else None
@@ -0,0 +1,151 @@
+"""
+Relecture animée de la trajectoire X/Y d'un joueur sur le terrain (module "Analyse vidéo").
+
+La feuille Vidéo ne contient pas d'horodatage : les positions sont supposées échantillonnées
+à fréquence constante (tracks.TRACK_SAMPLE_HZ), le temps d'un point est donc son rang / fréquence.
+Une fenêtre de temps est une tranche des tableaux décodés au chargement (vues sans copie,
+voir tracks.TrackStore), décimée côté serveur : le navigateur reçoit au plus
+REPLAY_MAX_POINTS points pour le tracé et REPLAY_MAX_FRAMES images, quelle que soit
+la durée du match.
+"""
+import math
+import os
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+
+from heatmaps import PITCH_LENGTH, PITCH_SHAPES, PITCH_WIDTH
+from tracks import TRACK_SAMPLE_HZ
+
+# Bornes de ce qui est envoyé au navigateur pour une fenêtre
+REPLAY_MAX_POINTS = int(os.environ.get("RAPPORT_REPLAY_MAX_POINTS", 2000))
+REPLAY_MAX_FRAMES = int(os.environ.get("RAPPORT_REPLAY_MAX_FRAMES", 200))
+# Traînée affichée derrière le joueur, en secondes
+REPLAY_TRAIL_SECONDS = 10
+REPLAY_TRAIL_MAX_POINTS = 20
+FRAME_DURATION_MS = 100
+
+
+def track_duration(x, sample_hz=TRACK_SAMPLE_HZ):
+    """Durée (s) couverte par une trajectoire de len(x) points."""
+    return len(x) / sample_hz
+
+
+def window_slice(n, start_s, end_s, sample_hz=TRACK_SAMPLE_HZ):
+    """Indices [i0, i1) des points compris dans la fenêtre [start_s, end_s]."""
+    i0 = min(max(int(math.floor(start_s * sample_hz)), 0), n)
+    i1 = min(max(int(math.ceil(end_s * sample_hz)) + 1, i0), n)
+    return i0, i1
+
+
+def decimate(x, y, i0, i1, max_points):
+    """Positions [i0, i1) avec un pas régulier, au plus max_points ; retourne (x, y, indices, pas)."""
+    step = max(1, math.ceil((i1 - i0) / max(max_points, 1)))
+    indices = np.arange(i0, i1, step)
+    return np.asarray(x[i0:i1:step]), np.asarray(y[i0:i1:step]), indices, step
+
+
+def _rounded(values):
+    # Listes arrondies au centimètre : JSON compact et validation Plotly bien plus rapide que sur des tableaux
+    return np.round(np.asarray(values, dtype=float), 2).tolist()
+
+
+def _clock(seconds, tenths=False):
+    """Temps "mm:ss", ou "mm:ss.d" avec tenths."""
+    if tenths:
+        minutes, seconds = divmod(round(seconds, 1), 60)
+        return f"{int(minutes):02d}:{seconds:04.1f}"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def replay_figure(x, y, start_s=0.0, end_s=None, sample_hz=TRACK_SAMPLE_HZ, max_points=REPLAY_MAX_POINTS,
+                  max_frames=REPLAY_MAX_FRAMES, trail_seconds=REPLAY_TRAIL_SECONDS):
+    """
+    Figure Plotly animée de la fenêtre [start_s, end_s] : tracé décimé de la fenêtre, puis une
+    image par pas de temps avec la position du joueur et sa traînée récente. Seules la traînée
+    et la position changent d'une image à l'autre.
+    Retourne (figure, résumé) ; le résumé donne les points de la fenêtre, les points envoyés,
+    le nombre d'images, la taille du JSON et la durée de préparation.
+    """
+    start = time.perf_counter()
+    if end_s is None:
+        end_s = track_duration(x, sample_hz)
+    i0, i1 = window_slice(len(x), start_s, end_s, sample_hz)
+    if i1 <= i0:
+        raise ValueError("Aucune position dans cette fenêtre de temps.")
+    path_x, path_y, _, _ = decimate(x, y, i0, i1, max_points)
+    frame_x, frame_y, frame_indices, frame_step = decimate(x, y, i0, i1, max_frames)
+    # Traînée : quelques points pris dans les trail_seconds précédant chaque image
+    trail_length = max(1, int(trail_seconds * sample_hz))
+    trail_step = max(1, math.ceil(trail_length / REPLAY_TRAIL_MAX_POINTS))
+
+    def trail(index):
+        lo = max(i0, index - trail_length)
+        return np.asarray(x[lo:index + 1:trail_step]), np.asarray(y[lo:index + 1:trail_step])
+
+    first_trail = trail(frame_indices[0])
+    fig = go.Figure(
+        data=[
+            go.Scatter(x=path_x, y=path_y, mode="lines", line=dict(color="rgba(0, 0, 255, 0.25)", width=1),
+                       hoverinfo="skip", name="Trajectoire"),
+            go.Scatter(x=first_trail[0], y=first_trail[1], mode="lines", line=dict(color="blue", width=3),
+                       hoverinfo="skip", name="Traînée"),
+            go.Scatter(x=frame_x[:1], y=frame_y[:1], mode="markers", marker=dict(color="red", size=12),
+                       name="Position"),
+        ]
+    )
+    # Noms d'images uniques (rang du point) : Plotly remplace une image de même nom. L'heure
+    # n'est que le libellé du curseur, au dixième de seconde si plusieurs images par seconde
+    tenths = frame_step < sample_hz
+    labels = {}
+    frames = []
+    for index, px, py in zip(frame_indices, frame_x, frame_y):
+        trail_x, trail_y = trail(index)
+        frames.append(dict(
+            data=[dict(type="scatter", x=_rounded(trail_x), y=_rounded(trail_y)),
+                  dict(type="scatter", x=_rounded([px]), y=_rounded([py]))],
+            traces=[1, 2],
+            name=str(int(index)),
+        ))
+        labels[frames[-1]["name"]] = _clock(index / sample_hz, tenths)
+    fig.frames = frames
+    # Lecture : une image par FRAME_DURATION_MS, sans transition (les positions sont déjà décimées)
+    play_args = dict(frame=dict(duration=FRAME_DURATION_MS, redraw=False), transition=dict(duration=0),
+                     fromcurrent=True, mode="immediate")
+    fig.update_layout(
+        shapes=PITCH_SHAPES,
+        xaxis=dict(range=[-3, PITCH_LENGTH + 3], showgrid=False, zeroline=False,
+                   showticklabels=False, visible=False, scaleanchor="y"),
+        yaxis=dict(range=[-3, PITCH_WIDTH + 3], showgrid=False, zeroline=False,
+                   showticklabels=False, visible=False, scaleanchor="x"),
+        # Marge basse pour les boutons et le curseur de temps sous le terrain
+        margin=dict(l=0, r=0, t=0, b=100),
+        showlegend=False,
+        updatemenus=[dict(
+            type="buttons", direction="left", x=0, y=0, xanchor="left", yanchor="top", pad=dict(t=40),
+            buttons=[
+                dict(label="Lecture", method="animate", args=[None, play_args]),
+                dict(label="Pause", method="animate",
+                     args=[[None], dict(frame=dict(duration=0, redraw=False), mode="immediate")]),
+            ],
+        )],
+        sliders=[dict(
+            x=0.15, y=0, len=0.85, xanchor="left", yanchor="top", pad=dict(t=30),
+            currentvalue=dict(prefix="Temps : "),
+            steps=[dict(method="animate", label=labels[frame["name"]],
+                        args=[[frame["name"]], dict(frame=dict(duration=0, redraw=False), mode="immediate")])
+                   for frame in frames],
+        )],
+    )
+    payload = len(fig.to_json())
+    summary = {
+        "window_points": i1 - i0,
+        "path_points": len(path_x),
+        "frames": len(frames),
+        "frame_step_seconds": frame_step / sample_hz,
+        "payload": payload,
+        "seconds": time.perf_counter() - start,
+    }
+    return fig, summary
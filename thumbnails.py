@@ -0,0 +1,100 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from PIL import Image, ImageFile
+
+from cache import LRUCache
+
+# Permettre à PIL de charger des images tronquées (comme pour l'affichage des photos)
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+# Largeur de la vignette affichée dans l'interface (200 px à l'écran, x2 pour les écrans haute densité)
+DISPLAY_WIDTH_PX = int(os.environ.get("RAPPORT_THUMBNAIL_DISPLAY_PX", 400))
+# Portrait du rapport PDF : largeur en mm, convertie en pixels à 96 DPI
+PDF_PORTRAIT_WIDTH_MM = 60
+PORTRAIT_DPI = 96
+THUMBNAIL_WORKERS = int(os.environ.get("RAPPORT_THUMBNAIL_WORKERS", min(8, os.cpu_count() or 1)))
+# Taille maximale (octets) des vignettes gardées en mémoire
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get("RAPPORT_THUMBNAIL_CACHE_MAX_BYTES", 128 * 1024 ** 2))
+
+_thumbnail_cache = LRUCache(THUMBNAIL_CACHE_MAX_BYTES)
+_warmup_pool = None
+_warmup_lock = threading.Lock()
+
+
+@dataclass
+class Portrait:
+    """Vignettes d'une photo du Trombi : affichage (PNG) et portrait du PDF (image et PNG)."""
+    key: str
+    display_png: bytes
+    pdf_image: Image.Image
+    pdf_png: bytes
+    pdf_height_mm: float
+
+    def nbytes(self):
+        return len(self.display_png) + len(self.pdf_png) + self.pdf_image.width * self.pdf_image.height * 4
+
+
+def _png_bytes(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _resize_to_width(img, width):
+    return img.resize((width, int(img.height * width / img.width)), Image.LANCZOS)
+
+
+def _build_portrait(key, content, pdf_width_mm):
+    pdf_width_px = int(pdf_width_mm * (PORTRAIT_DPI / 25.4))
+    with Image.open(io.BytesIO(content)) as img:
+        if img.format == "JPEG":
+            # Décodage JPEG réduit (1/2, 1/4, 1/8) au plus près de la plus grande vignette
+            width = max(DISPLAY_WIDTH_PX, pdf_width_px)
+            img.draft("RGB", (width, int(img.height * width / img.width)))
+        img = img.convert("RGBA")
+    pdf_image = _resize_to_width(img, pdf_width_px)
+    display_image = _resize_to_width(img, DISPLAY_WIDTH_PX) if img.width > DISPLAY_WIDTH_PX else img
+    return Portrait(
+        key=key,
+        display_png=_png_bytes(display_image),
+        pdf_image=pdf_image,
+        pdf_png=_png_bytes(pdf_image),
+        pdf_height_mm=pdf_image.height * 25.4 / PORTRAIT_DPI,
+    )
+
+
+def get_portrait(key, load, pdf_width_mm=PDF_PORTRAIT_WIDTH_MM):
+    """
+    Vignettes de la photo identifiée par key (stable pour un même contenu), générées au premier
+    appel puis partagées par toutes les sessions. load() n'est appelé (pour lire les octets de
+    la photo) que si elles ne sont pas en cache.
+    """
+    return _thumbnail_cache.get_or_create(
+        (key, pdf_width_mm), lambda: _build_portrait(key, load(), pdf_width_mm), sizeof=Portrait.nbytes
+    )
+
+
+def prepare_portraits(loads, pdf_width_mm=PDF_PORTRAIT_WIDTH_MM):
+    """
+    Lance en arrière-plan la génération des vignettes de loads ({clé: fonction de lecture})
+    et retourne aussitôt les futures. Le décodage et le redimensionnement PIL libèrent le GIL :
+    un pool de threads partagé par toutes les sessions suffit. Une photo demandée pendant sa
+    génération attend celle-ci (verrou par clé du cache). Les photos illisibles sont ignorées
+    ici (l'erreur réapparaît à l'affichage).
+    """
+    global _warmup_pool
+    with _warmup_lock:
+        if _warmup_pool is None:
+            _warmup_pool = ThreadPoolExecutor(max_workers=max(1, THUMBNAIL_WORKERS), thread_name_prefix="thumbnails")
+
+    def build(key, load):
+        try:
+            get_portrait(key, load, pdf_width_mm)
+        except Exception:
+            pass
+
+    return [_warmup_pool.submit(build, key, load) for key, load in loads.items()]
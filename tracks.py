@@ -0,0 +1,132 @@
+"""
+Trajectoires X/Y de la feuille Vidéo, décodées une seule fois au chargement.
+
+Chaque cellule X / Y contient les positions d'une session sous forme de texte
+"x1;x2;...". Toutes les lignes sont décodées en une passe (conversion du texte concaténé
+découpé sur ";") dans deux tableaux float32 plats, avec un tableau d'offsets par ligne et un
+index (Joueur, Session Title) -> ligne. Les longueurs X / Y et les valeurs non numériques
+ou non finies (nan, inf) sont vérifiées ici : les analyses (cartes de chaleur, ...) reçoivent des vues sans copie sur ces tableaux.
+Les tableaux sont ensuite conservés dans le store colonnaire et relus par mappage mémoire
+(voir columnar_store.read_tracks).
+"""
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+COORDINATE_COLUMNS = ("X", "Y")
+# Fréquence d'échantillonnage des positions X / Y (points par seconde) : la feuille Vidéo
+# n'a pas d'horodatage, le temps d'un point est son rang / fréquence
+TRACK_SAMPLE_HZ = float(os.environ.get("RAPPORT_TRACK_SAMPLE_HZ", 10))
+
+
+@dataclass
+class TrackStore:
+    """Positions de toutes les lignes de la feuille Vidéo (voir parse_tracks)."""
+    x: np.ndarray
+    y: np.ndarray
+    # offsets[i]:offsets[i + 1] délimite la ligne i dans x et y
+    offsets: np.ndarray
+    # (Joueur, Session Title) -> première ligne correspondante de la feuille
+    rows: dict = field(default_factory=dict)
+    # Ligne -> message d'erreur (longueurs X / Y différentes, valeur non numérique)
+    errors: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def row_track(self, row):
+        """Vues (x, y) en lecture seule sur les positions de la ligne row ; ValueError si elle est invalide."""
+        if row in self.errors:
+            raise ValueError(self.errors[row])
+        start, stop = self.offsets[row], self.offsets[row + 1]
+        return self.x[start:stop], self.y[start:stop]
+
+    def track(self, player, session):
+        """Positions (x, y) du joueur pour la session ; KeyError si la session est inconnue."""
+        return self.row_track(self.rows[(player, session)])
+
+    def nbytes(self):
+        """Mémoire occupée : les positions mappées depuis le store (np.memmap) ne comptent pas."""
+        resident = [array for array in (self.x, self.y) if not isinstance(array, np.memmap)]
+        return sum(array.nbytes for array in resident) + self.offsets.nbytes
+
+
+def _as_text(value):
+    if isinstance(value, str):
+        return value.strip().strip(";")
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return ";".join(map(str, value))
+    if value is None or pd.isna(value):
+        return ""
+    return str(value)
+
+
+def _parse_column(column):
+    """
+    Décode une colonne de textes "v1;v2;..." : retourne (valeurs float32 concaténées,
+    longueurs par ligne). Une ligne contenant une valeur non numérique ou non finie (nan, inf)
+    a une longueur -1 et aucune valeur.
+    """
+    texts = [_as_text(value) for value in column]
+    lengths = np.array([text.count(";") + 1 if text else 0 for text in texts], dtype=np.int64)
+    joined = ";".join(text for text in texts if text)
+    if not joined:
+        return np.empty(0, dtype=np.float32), lengths
+    tokens = joined.split(";")
+    try:
+        values = np.array(tokens, dtype=np.float32)
+    except ValueError:
+        # Jeton non numérique : NaN à sa place, la ligne est écartée ci-dessous
+        values = pd.to_numeric(pd.Series(tokens), errors="coerce").to_numpy(dtype=np.float32)
+    invalid = ~np.isfinite(values)
+    if invalid.any():
+        nonempty = lengths > 0
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])[nonempty]
+        bad_rows = np.zeros(len(lengths), dtype=bool)
+        bad_rows[nonempty] = np.add.reduceat(invalid, starts) > 0
+        values = values[np.repeat(~bad_rows, lengths)]
+        lengths[bad_rows] = -1
+    return values, lengths
+
+
+def parse_tracks(video_data):
+    """Décode les colonnes X et Y de la feuille Vidéo en un TrackStore."""
+    start = time.perf_counter()
+    x, x_lengths = _parse_column(video_data["X"])
+    y, y_lengths = _parse_column(video_data["Y"])
+
+    errors = {}
+    for row in np.flatnonzero((x_lengths != y_lengths) | (x_lengths < 0)):
+        if x_lengths[row] < 0 or y_lengths[row] < 0:
+            errors[int(row)] = "Les coordonnées X ou Y contiennent des valeurs non numériques ou non finies."
+        else:
+            errors[int(row)] = (
+                f"Les longueurs des coordonnées X ({x_lengths[row]}) et Y ({y_lengths[row]}) ne correspondent pas."
+            )
+    # Les lignes invalides sont retirées des tableaux : X et Y partagent alors les mêmes offsets
+    valid = x_lengths == y_lengths
+    valid[list(errors)] = False
+    if not valid.all():
+        x = x[np.repeat(valid, np.clip(x_lengths, 0, None))]
+        y = y[np.repeat(valid, np.clip(y_lengths, 0, None))]
+    offsets = np.zeros(len(video_data) + 1, dtype=np.int64)
+    np.cumsum(np.where(valid, x_lengths, 0), out=offsets[1:])
+
+    # Tableaux partagés par toutes les sessions via le cache des archives : lecture seule
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return TrackStore(
+        x=x, y=y, offsets=offsets, rows=track_rows(video_data), errors=errors, seconds=time.perf_counter() - start
+    )
+
+
+def track_rows(video_data):
+    """Index (Joueur, Session Title) -> première ligne de la feuille Vidéo."""
+    if not {"Joueur", "Session Title"} <= set(video_data.columns):
+        return {}
+    groups = video_data.groupby(["Joueur", "Session Title"], sort=False, dropna=False).indices
+    return {key: int(positions[0]) for key, positions in groups.items()}
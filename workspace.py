@@ -0,0 +1,179 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+# Dossier racine de tous les fichiers temporaires de l'application
+WORKSPACE_ROOT = os.environ.get("RAPPORT_WORKSPACE_DIR", os.path.join(tempfile.gettempdir(), "rapport_joueur"))
+# Quota disque total, toutes sessions confondues
+WORKSPACE_QUOTA_BYTES = int(os.environ.get("RAPPORT_WORKSPACE_QUOTA_BYTES", 512 * 1024 * 1024))
+# Âge maximal d'un fichier non utilisé avant suppression
+WORKSPACE_MAX_AGE_SECONDS = int(os.environ.get("RAPPORT_WORKSPACE_MAX_AGE_SECONDS", 6 * 3600))
+# Un fichier utilisé depuis moins longtemps n'est jamais évincé par le quota (PDF en cours, etc.)
+WORKSPACE_GRACE_SECONDS = 60
+
+
+class Workspace:
+    """
+    Gestionnaire unique des fichiers temporaires (PDF et archives ZIP de rapports).
+    Chaque session a son propre sous-dossier ; l'ensemble est borné par
+    un quota disque, avec suppression des fichiers trop anciens puis des moins récemment
+    utilisés, et nettoyage complet du sous-dossier à la fin de la session.
+    """
+
+    def __init__(self, root=WORKSPACE_ROOT, quota_bytes=WORKSPACE_QUOTA_BYTES,
+                 max_age_seconds=WORKSPACE_MAX_AGE_SECONDS, grace_seconds=WORKSPACE_GRACE_SECONDS):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.max_age_seconds = max_age_seconds
+        self.grace_seconds = grace_seconds
+        self._files = {}  # chemin -> [session_id, taille, dernier accès]
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+        self._sweep_orphans()
+
+    def session_dir(self, session_id):
+        path = os.path.join(self.root, session_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def new_file(self, session_id, suffix=""):
+        """Réserve un nouveau chemin de fichier dans le dossier de la session."""
+        path = os.path.join(self.session_dir(session_id), f"{uuid.uuid4().hex}{suffix}")
+        with self._lock:
+            self._files[path] = [session_id, 0, time.time()]
+        return path
+
+    def commit(self, path):
+        """Enregistre la taille d'un fichier réservé par new_file une fois écrit."""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                entry[1] = os.path.getsize(path) if os.path.exists(path) else 0
+                entry[2] = time.time()
+        self.enforce_quota()
+
+    def remove(self, path):
+        with self._lock:
+            self._files.pop(path, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def release_session(self, session_id):
+        """Supprime tous les fichiers d'une session terminée."""
+        with self._lock:
+            for path in [p for p, entry in self._files.items() if entry[0] == session_id]:
+                del self._files[path]
+        shutil.rmtree(os.path.join(self.root, session_id), ignore_errors=True)
+
+    def usage_bytes(self):
+        with self._lock:
+            return sum(entry[1] for entry in self._files.values())
+
+    def enforce_quota(self):
+        """Supprime les fichiers expirés, puis les moins récemment utilisés tant que le quota est dépassé."""
+        now = time.time()
+        with self._lock:
+            expired = [p for p, entry in self._files.items() if now - entry[2] > self.max_age_seconds]
+            for path in expired:
+                self._remove_locked(path)
+            total = sum(entry[1] for entry in self._files.values())
+            if total <= self.quota_bytes:
+                return
+            for path, entry in sorted(self._files.items(), key=lambda item: item[1][2]):
+                if total <= self.quota_bytes:
+                    break
+                if now - entry[2] < self.grace_seconds:
+                    continue
+                total -= entry[1]
+                self._remove_locked(path)
+
+    def _remove_locked(self, path):
+        self._files.pop(path, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _sweep_orphans(self):
+        """Au démarrage, supprime les fichiers laissés par un processus précédent et trop anciens."""
+        now = time.time()
+        for session_id in os.listdir(self.root):
+            session_path = os.path.join(self.root, session_id)
+            if not os.path.isdir(session_path):
+                continue
+            try:
+                if now - os.path.getmtime(session_path) > self.max_age_seconds:
+                    shutil.rmtree(session_path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+class SessionWorkspace:
+    """Vue du Workspace limitée à une session (voir session_workspace)."""
+
+    def __init__(self, workspace, session_id):
+        self.workspace = workspace
+        self.session_id = session_id
+
+    def new_file(self, suffix=""):
+        return self.workspace.new_file(self.session_id, suffix)
+
+    def commit(self, path):
+        self.workspace.commit(path)
+
+    def remove(self, path):
+        self.workspace.remove(path)
+
+    def release(self):
+        self.workspace.release_session(self.session_id)
+
+
+class _SessionGuard:
+    """Objet placé dans st.session_state : sa destruction (fin de session) libère les fichiers."""
+
+    def __init__(self, workspace, session_id):
+        weakref.finalize(self, workspace.release_session, session_id)
+
+
+_workspace = None
+_workspace_lock = threading.Lock()
+_local_guard = None
+
+
+def get_workspace():
+    global _workspace
+    with _workspace_lock:
+        if _workspace is None:
+            _workspace = Workspace()
+        return _workspace
+
+
+def session_workspace():
+    """
+    Retourne l'espace de fichiers temporaires de la session Streamlit courante.
+    Hors Streamlit (ligne de commande), un identifiant propre au processus est utilisé.
+    """
+    global _local_guard
+    workspace = get_workspace()
+    try:
+        import streamlit as st
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except ImportError:
+        ctx = None
+    if ctx is None:
+        session_id = f"local-{os.getpid()}"
+        if _local_guard is None:
+            # Libéré à la sortie de l'interpréteur (weakref.finalize s'exécute à atexit)
+            _local_guard = _SessionGuard(workspace, session_id)
+        return SessionWorkspace(workspace, session_id)
+    session_id = ctx.session_id
+    if "_workspace_guard" not in st.session_state:
+        st.session_state["_workspace_guard"] = _SessionGuard(workspace, session_id)
+    return SessionWorkspace(workspace, session_id)